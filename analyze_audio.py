@@ -4,13 +4,17 @@ Simple audio analysis tool for smoke detector debugging.
 Analyzes frequency content at specific time points without requiring matplotlib.
 """
 
-import numpy as np
-import librosa
 import sys
 from pathlib import Path
 
 def analyze_audio_at_timepoints(audio_file: str, timepoints: list):
     """Analyze frequency content at specific time points."""
+    # Imported here so usage errors return without loading numpy/scipy
+    import numpy as np
+    import soundfile as sf
+    from scipy import fft as sfft
+    from audio_io import load_audio
+    
     audio_path = Path(audio_file)
     
     if not audio_path.exists():
@@ -19,106 +23,128 @@ def analyze_audio_at_timepoints(audio_file: str, timepoints: list):
     
     print(f"Loading audio file: {audio_path}")
     
-    # Load audio
-    y, sr = librosa.load(audio_path, sr=48000)
-    duration = len(y) / sr
+    sr = 48000
+    window_size = 2048  # ~43ms at 48kHz
+    
+    # Extract the analysis window at each timepoint (None if beyond the end)
+    if sf.info(str(audio_path)).samplerate == sr:
+        # Already at the analysis rate: read just the windows instead of the whole file
+        with sf.SoundFile(audio_path) as f:
+            num_samples = f.frames
+            windows = []
+            for time_point in timepoints:
+                sample_idx = int(time_point * sr)
+                if sample_idx + window_size >= num_samples:
+                    windows.append(None)
+                    continue
+                f.seek(sample_idx)
+                windows.append(f.read(window_size, dtype='float32', always_2d=True).mean(axis=1))
+    else:
+        y, sr = load_audio(audio_path, sr)
+        num_samples = len(y)
+        windows = []
+        for time_point in timepoints:
+            sample_idx = int(time_point * sr)
+            if sample_idx + window_size >= num_samples:
+                windows.append(None)
+            else:
+                windows.append(y[sample_idx:sample_idx + window_size])
     
-    print(f"Duration: {duration:.1f}s")
+    print(f"Duration: {num_samples / sr:.1f}s")
     print(f"Sample rate: {sr} Hz")
-    print(f"Audio samples: {len(y)}")
+    print(f"Audio samples: {num_samples}")
     
-    # Analyze each timepoint
-    window_size = 2048  # ~43ms at 48kHz
+    # Window and transform all valid timepoints in one batched FFT
+    valid_windows = [window for window in windows if window is not None]
+    pos_freqs = sfft.rfftfreq(window_size, 1/sr)
+    if valid_windows:
+        # Apply window function to reduce spectral leakage (float32 keeps the FFT single precision)
+        windowed = np.stack(valid_windows) * np.hanning(window_size).astype(np.float32)[None, :]
+        # Real input, so only the non-negative frequency bins are needed; the
+        # rows are independent so scipy can spread them across all cores
+        all_mags = np.abs(sfft.rfft(windowed, axis=1, workers=-1))
+        # dB for every bin in one call (log10(0) -> -inf, as for silent bins before)
+        with np.errstate(divide='ignore'):
+            all_mags_db = 20 * np.log10(all_mags)
+    
+    # Energy ranges as bin bounds; the frequency grid is the same for every timepoint
+    ranges = [
+        (2800, 3200, "Typical smoke alarm range"),
+        (2000, 4000, "Extended smoke alarm range"), 
+        (1000, 2000, "Low frequency range"),
+        (4000, 8000, "High frequency range"),
+        (100, 1000, "Very low frequency range")
+    ]
+    range_bins = [
+        (label,
+         np.searchsorted(pos_freqs, low_freq, side='left'),
+         np.searchsorted(pos_freqs, high_freq, side='right'))
+        for low_freq, high_freq, label in ranges
+    ]
     
-    for i, time_point in enumerate(timepoints):
+    # Analyze each timepoint
+    row = 0
+    for time_point, window in zip(timepoints, windows):
         print(f"\n{'='*60}")
         print(f"ANALYSIS AT {time_point:.1f}s")
         print(f"{'='*60}")
         
-        # Get sample index
-        sample_idx = int(time_point * sr)
-        
-        if sample_idx + window_size >= len(y):
+        if window is None:
             print(f"⚠️  Time point beyond audio duration")
             continue
         
-        # Extract window
-        window = y[sample_idx:sample_idx + window_size]
-        
-        # Apply window function to reduce spectral leakage
-        windowed = window * np.hanning(window_size)
-        
-        # Compute FFT
-        fft = np.fft.fft(windowed)
-        fft_mag = np.abs(fft)
-        freqs = np.fft.fftfreq(window_size, 1/sr)
+        pos_mags = all_mags[row]
+        pos_mags_db = all_mags_db[row]
+        row += 1
         
-        # Only analyze positive frequencies
-        positive_mask = freqs >= 0
-        pos_freqs = freqs[positive_mask]
-        pos_mags = fft_mag[positive_mask]
-        
-        # Find peak frequencies
-        peak_indices = []
-        for j in range(1, len(pos_mags) - 1):
-            if pos_mags[j] > pos_mags[j-1] and pos_mags[j] > pos_mags[j+1]:
-                # Only consider significant peaks
-                if pos_mags[j] > 0.1 * np.max(pos_mags):
-                    peak_indices.append(j)
+        # Find peak frequencies (local maxima above 10% of the strongest bin)
+        center = pos_mags[1:-1]
+        is_peak = (
+            (center > pos_mags[:-2]) &
+            (center > pos_mags[2:]) &
+            (center > 0.1 * pos_mags.max())
+        )
+        peak_indices = np.flatnonzero(is_peak) + 1
         
         # Sort peaks by magnitude
-        peak_indices = sorted(peak_indices, key=lambda x: pos_mags[x], reverse=True)
+        peak_indices = peak_indices[np.argsort(-pos_mags[peak_indices], kind='stable')]
         
         print(f"Top frequency peaks:")
         for idx in peak_indices[:10]:  # Show top 10 peaks
-            freq = pos_freqs[idx]
-            mag = pos_mags[idx]
-            mag_db = 20 * np.log10(mag) if mag > 0 else -np.inf
-            print(f"   {freq:6.1f} Hz: {mag_db:6.1f} dB")
+            print(f"   {pos_freqs[idx]:6.1f} Hz: {pos_mags_db[idx]:6.1f} dB")
         
         # Check energy in smoke detector frequency ranges
         print(f"\nEnergy analysis:")
         
-        ranges = [
-            (2800, 3200, "Typical smoke alarm range"),
-            (2000, 4000, "Extended smoke alarm range"), 
-            (1000, 2000, "Low frequency range"),
-            (4000, 8000, "High frequency range"),
-            (100, 1000, "Very low frequency range")
-        ]
+        # Each range is a contiguous run of bins, so its energy is a direct
+        # float64 sum over that slice (a float32 spectrum's power can span far
+        # more range than differences of a running sum can resolve)
+        valid_ranges = [(label, lo, hi) for label, lo, hi in range_bins if hi > lo]
+        energies = np.array([np.square(pos_mags[lo:hi], dtype=np.float64).sum() for _, lo, hi in valid_ranges])
+        with np.errstate(divide='ignore'):
+            energies_db = 10 * np.log10(energies)
         
-        for low_freq, high_freq, label in ranges:
-            mask = (pos_freqs >= low_freq) & (pos_freqs <= high_freq)
-            if np.any(mask):
-                energy = np.sum(pos_mags[mask] ** 2)
-                energy_db = 10 * np.log10(energy) if energy > 0 else -np.inf
-                max_in_range = np.max(pos_mags[mask]) if np.any(mask) else 0
-                max_db = 20 * np.log10(max_in_range) if max_in_range > 0 else -np.inf
-                print(f"   {label:25s}: Energy = {energy_db:6.1f} dB, Peak = {max_db:6.1f} dB")
+        for (label, lo, hi), energy_db in zip(valid_ranges, energies_db):
+            max_db = pos_mags_db[lo:hi].max()
+            print(f"   {label:25s}: Energy = {energy_db:6.1f} dB, Peak = {max_db:6.1f} dB")
         
         # Check for tonal components (typical of smoke alarms)
         print(f"\nTonal analysis:")
         
-        # Look for strong narrow peaks that could be smoke alarms
-        smoke_candidates = []
-        for idx in peak_indices[:5]:  # Check top 5 peaks
-            freq = pos_freqs[idx]
-            mag = pos_mags[idx]
-            
-            if 2000 <= freq <= 4000:  # In smoke detector range
-                # Check if it's a narrow peak (tonal)
-                # Look at neighboring bins to see if it's narrow
-                left_mag = pos_mags[max(0, idx-2)] if idx >= 2 else 0
-                right_mag = pos_mags[min(len(pos_mags)-1, idx+2)] if idx < len(pos_mags)-2 else 0
-                avg_neighbor = (left_mag + right_mag) / 2
-                
-                if mag > 2 * avg_neighbor:  # Peak is significantly higher than neighbors
-                    smoke_candidates.append((freq, mag))
-                    
+        # Look for strong narrow peaks that could be smoke alarms among the top 5 peaks
+        idxs = peak_indices[:5]
+        idxs = idxs[(pos_freqs[idxs] >= 2000) & (pos_freqs[idxs] <= 4000)]  # In smoke detector range
+        
+        # Narrow (tonal) peaks stand well above the bins two either side; the
+        # zero padding stands in for neighbors that fall off the spectrum edge
+        padded = np.pad(pos_mags, 2)
+        avg_neighbor = (padded[idxs] + padded[idxs + 4]) / 2
+        tonal = idxs[pos_mags[idxs] > 2 * avg_neighbor]
+        smoke_candidates = list(zip(pos_freqs[tonal], pos_mags_db[tonal]))
+        
         if smoke_candidates:
             print(f"   Potential smoke alarm tones:")
-            for freq, mag in smoke_candidates:
-                mag_db = 20 * np.log10(mag) if mag > 0 else -np.inf
+            for freq, mag_db in smoke_candidates:
                 print(f"      {freq:6.1f} Hz at {mag_db:6.1f} dB")
         else:
             print(f"   No strong tonal components found in smoke detector range")
@@ -0,0 +1,84 @@
+"""Audio file loading shared by the file-based analysis and test tools."""
+
+import os
+from pathlib import Path
+from typing import Iterator, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+
+
+def load_audio(path: Union[str, Path], sample_rate: int) -> Tuple[np.ndarray, int]:
+    """Load an audio file as mono float32 samples at sample_rate.
+
+    The file is decoded with soundfile and only resampled when its native rate
+    differs from sample_rate, so files already at the target rate skip the
+    resampler entirely.
+
+    Args:
+        path: Audio file to load
+        sample_rate: Desired output sample rate in Hz
+
+    Returns:
+        Tuple of (mono float32 samples, sample_rate)
+    """
+    audio_data, native_rate = sf.read(str(path), dtype='float32', always_2d=False)
+    if audio_data.ndim > 1:
+        audio_data = audio_data.mean(axis=1, dtype=np.float32)
+
+    if native_rate != sample_rate:
+        import librosa  # Only needed (and only paid for) when resampling
+        audio_data = librosa.resample(audio_data, orig_sr=native_rate, target_sr=sample_rate, res_type='soxr_hq')
+
+    return audio_data, sample_rate
+
+
+def open_audio_blocks(path: Union[str, Path], sample_rate: int, block_samples: int) -> Tuple[int, Iterator[np.ndarray]]:
+    """Stream an audio file as mono float32 samples at sample_rate, block_samples at a time.
+
+    Files already at sample_rate are decoded block by block, so a long recording
+    is never held in memory whole; files that need resampling are loaded and
+    resampled with load_audio and then split into blocks. The whole file is
+    prefetched first, so disk reads overlap with processing of earlier blocks.
+
+    Args:
+        path: Audio file to load
+        sample_rate: Desired output sample rate in Hz
+        block_samples: Samples per block (the last block may be shorter)
+
+    Returns:
+        Tuple of (total number of samples, iterator over the blocks)
+    """
+    prefetch(path)
+    info = sf.info(str(path))
+    if info.samplerate != sample_rate:
+        audio_data, _ = load_audio(path, sample_rate)
+        return len(audio_data), (audio_data[i:i + block_samples] for i in range(0, len(audio_data), block_samples))
+    return info.frames, _read_blocks(path, block_samples)
+
+
+def _read_blocks(path: Union[str, Path], block_samples: int) -> Iterator[np.ndarray]:
+    with sf.SoundFile(str(path)) as f:
+        for block in f.blocks(blocksize=block_samples, dtype='float32'):
+            yield block.mean(axis=1, dtype=np.float32) if block.ndim > 1 else block
+
+
+def prefetch(path: Union[str, Path]) -> None:
+    """Ask the kernel to start reading a file into the page cache in the background.
+
+    A readahead hint (posix_fadvise WILLNEED) that returns immediately, so reads
+    of the file overlap with whatever the caller does next. A no-op where the
+    call is unavailable or the file cannot be opened.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
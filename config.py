@@ -1,5 +1,6 @@
 """Configuration management using pydantic-settings."""
 
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 from pydantic import BaseModel
@@ -68,17 +69,23 @@ def load_config(config_path: Optional[Path] = None) -> Config:
         config_path: Path to config file. Uses 'config.json' in script directory if None.
 
     Returns:
-        Configuration loaded from file or defaults.
+        Configuration loaded from file or defaults. The result is cached per
+        path, so repeated calls return the same instance without re-reading
+        the file.
     """
     if config_path is None:
         config_path = Path(__file__).parent / 'config.json'
 
-    return Config(_settings_customise_sources=(
-        lambda settings_cls, init_settings, env_settings, dotenv_settings, file_secret_settings: (
-            init_settings,
-            JsonConfigSettingsSource(settings_cls, json_file=config_path),
-            env_settings,
-            dotenv_settings,
-            file_secret_settings,
-        )
-    ))
\ No newline at end of file
+    return _load_config(Path(config_path))
+
+
+@lru_cache(maxsize=8)
+def _load_config(config_path: Path) -> Config:
+    """Parse and validate the config at config_path (cached by load_config)."""
+    # Config's JSON source reads model_config['json_file'], so point a subclass at
+    # this path rather than building a new settings source on every call
+    settings_cls = type(Config.__name__, (Config,), {
+        '__module__': __name__,
+        'model_config': SettingsConfigDict(**{**Config.model_config, 'json_file': config_path}),
+    })
+    return settings_cls()
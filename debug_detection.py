@@ -5,10 +5,8 @@ Uses the main algorithm with instrumentation hooks to eliminate code duplication
 """
 import argparse
 
-import numpy as np
-import librosa
+from collections import deque
 from pathlib import Path
-from smoke_detection_algorithm import SmokeAlarmDetector
 
 class DebugSmokeAlarmDetector:
     """Debug version with detailed logging using instrumentation hooks."""
@@ -20,7 +18,11 @@ class DebugSmokeAlarmDetector:
         target_frequency: float = 3200.0,
         frequency_tolerance: float = 300.0,
     ):
-        self.potential_beeps = []
+        # Imported here so `--help` and argument errors return without loading numpy/scipy
+        from smoke_detection_algorithm import SmokeAlarmDetector
+        
+        self.potential_beeps = deque(maxlen=1024)  # Most recent potential beeps (bounded for long files)
+        self.potential_beep_count = 0
         self.debug_output_count = 0
         
         # Create main detector and set instrumentation hooks
@@ -79,9 +81,10 @@ class DebugSmokeAlarmDetector:
             }
             
             self.potential_beeps.append(result)
+            self.potential_beep_count += 1
             
             # Only print every 10th potential beep to avoid spam
-            if len(self.potential_beeps) % 10 == 0:
+            if self.potential_beep_count % 10 == 0:
                 print(f"   🔍 Time: {timestamp:.1f}s, Freq: {peak_frequency:.1f}Hz, SNR: {signal_to_background:.1f}")
                 print(f"       Peak: {peak_magnitude:.1f}, Threshold90: {magnitude_threshold_90:.1f}, Mean: {mean_magnitude:.1f}")
                 print(f"       Passes - SNR>10: {passes_snr}, Peak>2xThresh: {passes_percentile}, Peak>15xMean: {passes_mean}")
@@ -98,34 +101,42 @@ class DebugSmokeAlarmDetector:
             print(f"       Frequency occupation: {data['frequency_occupation_ratio']:.2f}, Avg frequency: {data['avg_frequency']:.1f}Hz")
     
     def debug_audio_file(self, audio_file: Path):
-        """Debug process an audio file using main detector with hooks."""
+        """Debug process an audio file using main detector with hooks.
+        
+        Returns:
+            List of potential beep dicts, oldest first; only the most recent 1024
+            are kept, so earlier ones are dropped on long files
+        """
         print(f"🔍 DEBUG: Processing {audio_file.name}")
         
-        # Load audio file
-        audio_data, sr = librosa.load(audio_file, sr=self.detector.sample_rate, mono=True)
-        print(f"   Audio length: {len(audio_data)} samples, {len(audio_data)/sr:.1f}s")
+        from audio_io import open_audio_blocks
         
-        # Process chunks using main detector
+        sr = self.detector.sample_rate
         chunk_samples = self.detector.chunk_size
-        total_chunks = len(audio_data) // chunk_samples
+        total_samples, blocks = open_audio_blocks(audio_file, sr, 64 * chunk_samples)
+        print(f"   Audio length: {total_samples} samples, {total_samples/sr:.1f}s")
+        
+        # Decode 64 chunks at a time and transform each block with one batched
+        # FFT; the main detector still runs (and calls our hooks) chunk by chunk
+        start_sample = 0
+        for block in blocks:
+            self.detector.process_audio_batch(block, start_sample)
+            start_sample += len(block)
+        total_chunks = total_samples // chunk_samples
         
-        for i in range(0, len(audio_data) - chunk_samples, chunk_samples):
-            chunk = audio_data[i:i + chunk_samples]
-            chunk_start_time = i / sr
-            
-            # Process chunk using main detector (which will call our hooks)
-            detection = self.detector.process_audio_chunk(chunk, chunk_start_time)
-            
         print(f"\n📊 SUMMARY:")
         print(f"   Total chunks processed: {total_chunks}")
-        print(f"   Potential beeps found: {len(self.potential_beeps)}")
+        print(f"   Potential beeps found: {self.potential_beep_count}")
         
         if self.potential_beeps:
             print(f"\n🔊 POTENTIAL BEEPS:")
-            for i, beep in enumerate(self.potential_beeps, 1):
+            if self.potential_beep_count > len(self.potential_beeps):
+                print(f"   (showing the last {len(self.potential_beeps)})")
+            first = self.potential_beep_count - len(self.potential_beeps) + 1
+            for i, beep in enumerate(self.potential_beeps, first):
                 print(f"   {i}. Time: {beep['time']:.1f}s, Freq: {beep['frequency']:.1f}Hz, SNR: {beep['snr']:.1f}, Peak: {beep['peak_mag']:.1f}")
         
-        return self.potential_beeps
+        return list(self.potential_beeps)
 
 def main():
     parser = argparse.ArgumentParser(description="Debug Detection")
@@ -11,22 +11,34 @@ Usage:
 """
 
 import argparse
+import functools
 import json
 import os
+import shutil
 import subprocess
 import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
 import re
 
+_UNSAFE_FILENAME_RE = re.compile(r'[<>:"/\\|?*]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
 
 class TestAudioExtractor:
     def __init__(self, test_dir: str = "test_audio"):
         self.test_dir = Path(test_dir)
         self.config_file = self.test_dir / "test_cases.json"
+        # Persist yt-dlp's player/extractor cache so it isn't refetched per case
+        self.cache_dir = self.test_dir / ".yt_dlp_cache"
         self._ensure_dirs()
     
     @staticmethod
+    @functools.lru_cache(maxsize=512)
     def _parse_time(time_str: str) -> float:
         """Parse time string in format MM:SS or SS to seconds."""
         time_str = time_str.strip()
@@ -56,8 +68,12 @@ class TestAudioExtractor:
             return json.load(f)
     
     def _save_config(self, config: Dict):
-        with open(self.config_file, 'w') as f:
+        # Write to a sibling temp file and swap it in, so an interrupted save
+        # never leaves a truncated test_cases.json behind
+        tmp_file = self.config_file.with_suffix('.json.tmp')
+        with open(tmp_file, 'w') as f:
             json.dump(config, f, indent=2)
+        os.replace(tmp_file, self.config_file)
     
     def add_test_case(
         self, 
@@ -115,6 +131,9 @@ class TestAudioExtractor:
             config["test_cases"].append(test_case)
             self._save_config(config)
             print(f"   ✅ Audio extracted successfully!")
+            video_duration = test_case.get("video_duration")
+            if video_duration is not None and end_seconds > video_duration:
+                print(f"   ⚠️  End time is past the end of the video ({video_duration:.1f}s)")
         else:
             print(f"   ❌ Audio extraction failed")
     
@@ -138,29 +157,60 @@ class TestAudioExtractor:
                 print(f"   Expected alarms: {case['expected_alarms']}")
             print()
 
+    def extract_all(self, max_workers: Optional[int] = None):
+        """Extract audio for every configured case whose file is missing.
+
+        Each extraction is a separate yt-dlp process that spends most of its time
+        waiting on the network, so cases are dispatched concurrently from a
+        thread pool instead of one after another. Cases that share a URL are
+        extracted by a single yt-dlp run.
+        """
+        config = self._load_config()
+        pending = [case for case in config["test_cases"]
+                   if not (self.test_dir / case["filename"]).exists()]
+
+        if not pending:
+            print("✅ All test cases already extracted.")
+            return
+
+        by_url = [list(group) for _, group in
+                  groupby(sorted(pending, key=lambda c: c["url"]), key=lambda c: c["url"])]
+        workers = max_workers or min(len(by_url), os.cpu_count() or 1)
+        print(f"🎵 Extracting {len(pending)} pending case(s) from {len(by_url)} video(s) "
+              f"with {workers} worker(s)...")
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._extract_group, cases) for cases in by_url]
+            for future in as_completed(futures):
+                for case, ok in future.result():
+                    if ok:
+                        print(f"   ✅ {case['description']}")
+                    else:
+                        print(f"   ❌ {case['description']}")
+                        failed.append(case)
+
+        # Workers may annotate their case dicts; write the config once, from this thread
+        if len(failed) < len(pending):
+            self._save_config(config)
+        print(f"\n📊 Extracted {len(pending) - len(failed)}/{len(pending)} case(s)")
+
     def _extract_audio(self, case: Dict) -> bool:
         """Extract audio segment using yt-dlp and ffmpeg."""
         output_path = self.test_dir / case["filename"]
         
         try:
-            # Use yt-dlp to download and ffmpeg to extract segment
-            cmd = [
-                "yt-dlp",
-                "--extract-audio",
-                "--audio-format", "wav",
-                "--audio-quality", "0",  # Best quality
-                "--postprocessor-args",
-                f"ffmpeg:-ss {case['start_time']} -t {case['duration']} -ar 44100 -ac 1",
-                "--output", str(output_path.with_suffix('.%(ext)s')),
-                case["url"]
-            ]
+            # Let yt-dlp fetch only the requested section (input-side seek)
+            # rather than decoding from t=0 and trimming afterwards
+            cmd = self._yt_dlp_cmd(output_path.with_suffix('.%(ext)s'), [case], case["url"])
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            returncode, stderr_tail = self._run_yt_dlp(cmd)
             
-            if result.returncode == 0:
+            if returncode == 0:
+                self._read_info_json(case, output_path.with_suffix('.info.json'))
                 return output_path.exists()
             else:
-                print(f"   Error: {result.stderr}")
+                print(f"   Error ({case['filename']}): {stderr_tail}")
                 return False
                 
         except FileNotFoundError:
@@ -170,13 +220,113 @@ class TestAudioExtractor:
             print(f"   Error: {e}")
             return False
     
-    def _sanitize_filename(self, filename: str) -> str:
+    @staticmethod
+    def _run_yt_dlp(cmd: List[str]) -> Tuple[int, str]:
+        """Run yt-dlp, keeping only the tail of its stderr for error reporting.
+
+        Returns:
+            Tuple of (return code, last lines of stderr)
+        """
+        with subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True) as proc:
+            stderr_tail = deque(proc.stderr, maxlen=50)
+            returncode = proc.wait()
+        return returncode, "".join(stderr_tail)
+
+    def _yt_dlp_cmd(self, output_template: Path, cases: List[Dict], url: str) -> List[str]:
+        """Build a yt-dlp command fetching each case's section of url as 44.1 kHz mono WAV."""
+        cmd = [
+            "yt-dlp",
+            "--extract-audio",
+            "--audio-format", "wav",
+            "--audio-quality", "0",  # Best quality
+            "--write-info-json",  # Video metadata from the same request
+            "--cache-dir", str(self.cache_dir),
+            "--postprocessor-args", "ffmpeg:-ar 44100 -ac 1",
+            "--output", str(output_template),
+        ]
+        for case in cases:
+            cmd += ["--download-sections", f"*{case['start_time']}-{case['end_time']}"]
+        cmd.append(url)
+        return cmd
+
+    def _extract_group(self, cases: List[Dict]) -> List[Tuple[Dict, bool]]:
+        """Extract several segments of one video with a single yt-dlp run."""
+        if len(cases) == 1:
+            return [(cases[0], self._extract_audio(cases[0]))]
+
+        # Sections land in a scratch dir named by their start time, then get
+        # matched back to their cases and moved into place
+        with tempfile.TemporaryDirectory(dir=self.test_dir) as scratch:
+            scratch_dir = Path(scratch)
+            cmd = self._yt_dlp_cmd(scratch_dir / "%(section_start)s.%(ext)s", cases, cases[0]["url"])
+
+            try:
+                returncode, stderr_tail = self._run_yt_dlp(cmd)
+            except FileNotFoundError:
+                print("   Error: yt-dlp not found. Install with: pip install yt-dlp")
+                return [(case, False) for case in cases]
+
+            if returncode != 0:
+                print(f"   Error ({cases[0]['url']}): {stderr_tail}")
+                return [(case, False) for case in cases]
+
+            sections = {}
+            for wav in scratch_dir.glob("*.wav"):
+                try:
+                    sections[float(wav.stem)] = wav
+                except ValueError:
+                    continue
+
+            results = []
+            for case in cases:
+                start = min(sections, key=lambda t: abs(t - case["start_time"]), default=None)
+                if start is None or abs(start - case["start_time"]) > 0.5:
+                    results.append((case, False))
+                    continue
+                wav = sections.pop(start)
+                self._read_info_json(case, wav.with_suffix('.info.json'))
+                shutil.move(str(wav), self.test_dir / case["filename"])
+                results.append((case, True))
+            return results
+
+    @staticmethod
+    def _read_info_json(case: Dict, info_path: Path):
+        """Copy video metadata written by yt-dlp into the case, then remove the file."""
+        if not info_path.exists():
+            return
+        try:
+            with open(info_path) as f:
+                info = json.load(f)
+            if info.get("duration") is not None:
+                case["video_duration"] = info["duration"]
+            if info.get("title"):
+                case["video_title"] = info["title"]
+        except (OSError, ValueError) as e:
+            print(f"   Warning: could not read {info_path.name}: {e}")
+        finally:
+            info_path.unlink(missing_ok=True)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _sanitize_filename(filename: str) -> str:
         """Convert description to safe filename."""
-        import re
         # Remove/replace unsafe characters
-        safe = re.sub(r'[<>:"/\\|?*]', '', filename)
-        safe = re.sub(r'\s+', '_', safe.strip())
-        return safe.lower()
+        safe = _UNSAFE_FILENAME_RE.sub('', filename)
+        return _WHITESPACE_RE.sub('_', safe.strip()).lower()
+
+
+def _cmd_add(args, extractor: TestAudioExtractor):
+    expected_alarms = None
+    if args.expect_alarms:
+        expected_alarms = [t.strip() for t in args.expect_alarms.split(',')]
+    
+    extractor.add_test_case(
+        args.url, 
+        args.description, 
+        args.start_time, 
+        args.end_time,
+        expected_alarms
+    )
 
 
 def main():
@@ -190,9 +340,16 @@ def main():
     add_parser.add_argument("start_time", help="Start time (MM:SS or seconds)")
     add_parser.add_argument("end_time", help="End time (MM:SS or seconds)")
     add_parser.add_argument("--expect-alarms", help="Expected alarm timestamps (comma-separated, MM:SS or seconds)")
+    add_parser.set_defaults(func=_cmd_add)
     
     # List command
-    subparsers.add_parser("list", help="List all test cases")
+    list_parser = subparsers.add_parser("list", help="List all test cases")
+    list_parser.set_defaults(func=lambda args, extractor: extractor.list_test_cases())
+
+    # Extract-all command
+    extract_parser = subparsers.add_parser("extract-all", help="Extract audio for any pending test cases")
+    extract_parser.add_argument("--jobs", type=int, help="Maximum concurrent yt-dlp processes")
+    extract_parser.set_defaults(func=lambda args, extractor: extractor.extract_all(max_workers=args.jobs))
     
     args = parser.parse_args()
     
@@ -200,23 +357,8 @@ def main():
         parser.print_help()
         return
     
-    extractor = TestAudioExtractor()
-    
-    if args.command == "add":
-        expected_alarms = None
-        if args.expect_alarms:
-            expected_alarms = [t.strip() for t in args.expect_alarms.split(',')]
-        
-        extractor.add_test_case(
-            args.url, 
-            args.description, 
-            args.start_time, 
-            args.end_time,
-            expected_alarms
-        )
-    
-    elif args.command == "list":
-        extractor.list_test_cases()
+    # Only touch test_audio/ once we know a command will actually use it
+    args.func(args, TestAudioExtractor())
     
 
 if __name__ == "__main__":
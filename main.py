@@ -10,7 +10,10 @@ import time
 import argparse
 import asyncio
 import logging
+import queue
+import signal
 import sys
+import threading
 import requests
 from pathlib import Path
 from config import load_config, Config
@@ -37,7 +40,7 @@ def create_trigger_alarm_callback(notification_manager: NotificationManager):
         print("-" * 50)
         
         # Send notifications if manager is configured
-        if notification_manager and notification_manager.notifiers:
+        if notification_manager and notification_manager.has_enabled:
             event = DetectionEvent(
                 timestamp=detection['timestamp'],
                 frequency=detection['frequency'],
@@ -48,21 +51,7 @@ def create_trigger_alarm_callback(notification_manager: NotificationManager):
             
             # Run notifications in background to not block detection
             try:
-                # Try to get the main thread's event loop
-                try:
-                    loop = asyncio.get_running_loop()
-                    # Schedule the coroutine to run in the main thread's event loop
-                    asyncio.run_coroutine_threadsafe(notification_manager.notify_all(event), loop)
-                except RuntimeError:
-                    # No running loop, create a new one in a thread
-                    import threading
-
-                    def run_notification():
-                        asyncio.run(notification_manager.notify_all(event))
-
-                    thread = threading.Thread(target=run_notification, daemon=True)
-                    thread.start()
-                    
+                notification_manager.dispatch(event)
             except Exception as e:
                 logging.error(f"Failed to send notifications: {e}")
                 print(f"⚠️  Failed to send notifications: {e}")
@@ -86,16 +75,78 @@ def send_heartbeat(url: str):
         logging.error(f"Failed to send heartbeat: {e}")
 
 
-def audio_callback(indata: np.ndarray, frames: int, time_info, status, detector: SmokeAlarmDetector) -> None:
-    """Audio callback for live monitoring."""
-    if status:
-        print(f"Audio callback status: {status}")
+class ChunkHandoff:
+    """Passes captured audio blocks from the audio thread to the detector thread.
 
-    # Convert to mono if stereo
-    audio_data = indata[:, 0] if indata.ndim > 1 else indata
+    Blocks are copied into a fixed pool of preallocated slots; the audio callback
+    only takes a free slot, copies into it and queues its index, so it never
+    waits on the detector. If every slot is still in use the block is dropped
+    and counted instead.
+    """
 
-    # Stream audio to detector
-    detector.process_audio_stream(audio_data)
+    def __init__(self, n_slots: int, blocksize: int, channels: int, dtype: str):
+        self.slots = np.empty((n_slots, blocksize, channels), dtype=dtype)
+        self.dropped = 0
+        self._free: queue.SimpleQueue = queue.SimpleQueue()
+        self._ready: queue.SimpleQueue = queue.SimpleQueue()
+        for slot in range(n_slots):
+            self._free.put(slot)
+
+    def put(self, indata: np.ndarray, frames: int, timestamp: float, status) -> None:
+        """Copy a block into a free slot and queue it (audio thread)."""
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return
+        self.slots[slot, :frames] = indata
+        self._ready.put((slot, frames, timestamp, status))
+
+    def get(self, timeout: float):
+        """Next queued (slot, frames, timestamp, status), or None after timeout (detector thread)."""
+        try:
+            return self._ready.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, slot: int) -> None:
+        """Return a slot to the pool once its block has been processed."""
+        self._free.put(slot)
+
+
+def audio_callback(indata: np.ndarray, frames: int, time_info, status, handoff: ChunkHandoff) -> None:
+    """Audio callback for live monitoring: hand the block to the detector thread."""
+    handoff.put(indata, frames, time.time(), status)
+
+
+def run_detection(handoff: ChunkHandoff, detector: SmokeAlarmDetector, stop_event: threading.Event) -> None:
+    """Detector thread: feed queued blocks to the detector until stop_event is set."""
+    dropped = 0
+    while not stop_event.is_set():
+        item = handoff.get(timeout=0.5)
+        if item is None:
+            continue
+        slot, frames, timestamp, status = item
+        try:
+            if status:
+                print(f"Audio callback status: {status}")
+            if handoff.dropped != dropped:
+                print(f"⚠️  Detector fell behind; dropped {handoff.dropped - dropped} audio block(s)")
+                dropped = handoff.dropped
+
+            # The stream is mono, so the slot is already a contiguous block; int16
+            # goes to the detector as-is (it folds the int16 scale into its window)
+            audio_data = handoff.slots[slot, :frames].reshape(-1)
+
+            # Stream audio to detector, stamped with its capture time
+            detector.process_audio_stream(audio_data, timestamp)
+        finally:
+            handoff.release(slot)
+
+
+def _raise_keyboard_interrupt(signum, frame) -> None:
+    """Signal handler that stops the main loop the same way Ctrl+C does."""
+    raise KeyboardInterrupt
 
 
 def setup_logging(verbose: bool = False):
@@ -165,7 +216,11 @@ async def test_notifiers(manager: NotificationManager):
 
 
 def get_audio_device(device_arg):
-    """Get and validate audio device."""
+    """Get and validate audio device.
+
+    Returns:
+        Tuple of (device index, device info), from a single device enumeration
+    """
     devices = sd.query_devices()
     
     # If no device specified, show available devices and prompt
@@ -182,9 +237,10 @@ def get_audio_device(device_arg):
             print("❌ No input devices available")
             sys.exit(1)
         
-        print(f"\nUsing default device {sd.default.device[0]}: {devices[sd.default.device[0]]['name']}")
+        default_id = sd.default.device[0]
+        print(f"\nUsing default device {default_id}: {devices[default_id]['name']}")
         print("Use --device <number> to specify a different device\n")
-        return sd.default.device[0]
+        return default_id, devices[default_id]
     
     # Parse device argument (could be number or name)
     try:
@@ -209,7 +265,7 @@ def get_audio_device(device_arg):
         print(f"❌ Device {device_id} ({device_info['name']}) has no input channels")
         sys.exit(1)
     
-    return device_id
+    return device_id, device_info
 
 
 def main():
@@ -249,8 +305,7 @@ def main():
     # Use device from command line, then config file, then auto-detect
     audio_device = config.audio.device
     device_spec = args.device if args.device else audio_device if audio_device is not None else None
-    device_id = get_audio_device(device_spec)
-    device_info = sd.query_devices()[device_id]
+    device_id, device_info = get_audio_device(device_spec)
 
     # Setup detector
     detector = SmokeAlarmDetector()
@@ -281,27 +336,41 @@ def main():
 
     print("Press Ctrl+C to stop")
 
+    # Treat SIGTERM (systemd stop) like Ctrl+C
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    stop_event = threading.Event()
+
+    # Detection runs on its own thread; the audio callback only copies blocks out
+    handoff = ChunkHandoff(n_slots=32, blocksize=detector.chunk_size, channels=1, dtype='int16')  # ~3s of audio
+    detection_thread = threading.Thread(target=run_detection, args=(handoff, detector, stop_event), daemon=True)
+    detection_thread.start()
+
     try:
         with sd.InputStream(
             device=device_id,
-            callback=lambda indata, frames, time_info, status: audio_callback(indata, frames, time_info, status, detector),
+            callback=lambda indata, frames, time_info, status: audio_callback(indata, frames, time_info, status, handoff),
             channels=1,
+            dtype='int16',  # Native PCM; half the bytes of float32 through the callback
             samplerate=detector.sample_rate,
             blocksize=detector.chunk_size,
             latency=0.2  # 200ms buffer (explicit value instead of 'high')
         ):
+            # Sleep until the next heartbeat is due (or indefinitely) instead of
+            # polling; Ctrl+C / SIGTERM interrupt the wait with KeyboardInterrupt.
+            # Nothing sets stop_event here, it only serves as the sleep.
             while True:
-                # Check if it's time to send heartbeat
-                if next_heartbeat_time is not None and time.time() >= next_heartbeat_time:
-                    send_heartbeat(heartbeat_url)
-                    next_heartbeat_time = time.time() + heartbeat_interval
-
-                time.sleep(0.1)
+                timeout = None if next_heartbeat_time is None else max(0.0, next_heartbeat_time - time.time())
+                stop_event.wait(timeout)
+                send_heartbeat(heartbeat_url)
+                next_heartbeat_time = time.time() + heartbeat_interval
 
     except KeyboardInterrupt:
         print("\n🛑 Stopping smoke alarm detection...")
     except Exception as e:
         print(f"❌ Error: {e}")
+    finally:
+        stop_event.set()
+        detection_thread.join(timeout=2)
 
 
 if __name__ == "__main__":
@@ -5,12 +5,17 @@ Provides a framework for sending alerts through various channels.
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Optional, List
+from typing import Any, Dict, Optional, List, Literal, Tuple
 import time
+import random
 import logging
 import asyncio
+import threading
+import queue
 import requests
+from requests.adapters import HTTPAdapter
 from dataclasses import dataclass
+from functools import cached_property
 
 
 @dataclass
@@ -22,6 +27,21 @@ class DetectionEvent:
     confidence: float
     detection_type: str
 
+    @cached_property
+    def text(self) -> str:
+        """Notification body, formatted once and shared by every notifier."""
+        return (
+            f"Frequency: {self.frequency:.1f} Hz\n"
+            f"Signal Strength: {self.strength:.2f}\n"
+            f"Confidence: {self.confidence:.2%}\n"
+            f"Time: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.timestamp))}"
+        )
+
+    def title(self, is_test: bool = False) -> str:
+        """Notification title, prefixed for test notifications."""
+        title = "SMOKE ALARM DETECTED!"
+        return "TEST: " + title if is_test else title
+
 
 class BaseNotifier(ABC):
     """Base abstract class for all notification implementations."""
@@ -33,9 +53,20 @@ class BaseNotifier(ABC):
         self.retry_delay = retry_delay
         self.logger = logging.getLogger(f"notifier.{name}")
     
+    def build_payload(self, event: DetectionEvent, is_test: bool = False) -> Any:
+        """Build the request payload for event once, before any retries. Optional."""
+        return None
+
     @abstractmethod
-    async def send_notification(self, event: DetectionEvent, is_test: bool = False) -> bool:
-        """Send notification for detection event. Returns True on success."""
+    async def send_notification(
+        self, event: DetectionEvent, is_test: bool = False, payload: Any = None
+    ) -> Optional[bool]:
+        """Send notification for detection event.
+
+        payload is whatever build_payload returned, reused across retry attempts.
+        Returns True on success, False on a failure worth retrying, or None on a
+        permanent failure (e.g. a 4xx response) that retrying can't fix.
+        """
         pass
     
     async def notify_with_retry(self, event: DetectionEvent, is_test: bool = False) -> bool:
@@ -43,22 +74,27 @@ class BaseNotifier(ABC):
         if not self.enabled:
             self.logger.debug(f"Notifier {self.name} is disabled, skipping")
             return True
-            
+
+        payload = self.build_payload(event, is_test)
         for attempt in range(self.max_retries + 1):
             try:
-                success = await self.send_notification(event, is_test)
+                success = await self.send_notification(event, is_test, payload)
                 if success:
                     if attempt > 0:
                         self.logger.info(f"Notification sent successfully on attempt {attempt + 1}")
                     return True
+                elif success is None:
+                    self.logger.error("Notification failed permanently, not retrying")
+                    return False
                 else:
                     self.logger.warning(f"Notification failed on attempt {attempt + 1}")
             except Exception as e:
                 self.logger.error(f"Notification attempt {attempt + 1} failed: {e}")
             
             if attempt < self.max_retries:
-                delay = self.retry_delay * (2 ** attempt)  # Exponential backoff
-                self.logger.info(f"Retrying in {delay}s...")
+                # Exponential backoff, jittered so notifiers don't retry in lockstep
+                delay = self.retry_delay * (2 ** attempt) * (1 + random.random() * 0.3)
+                self.logger.info(f"Retrying in {delay:.1f}s...")
                 await asyncio.sleep(delay)
         
         self.logger.error(f"All {self.max_retries + 1} notification attempts failed")
@@ -73,28 +109,33 @@ class NtfyNotifier(BaseNotifier):
         self.topic = topic
         self.server = server.rstrip('/')
         self.url = f"{self.server}/{self.topic}"
+        # Reuse the TLS connection to the server across notifications. One host,
+        # a few concurrent sends at most; retries are handled by notify_with_retry
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
     
-    async def send_notification(self, event: DetectionEvent, is_test: bool = False) -> bool:
-        """Send notification via ntfy.sh."""
-        title = "SMOKE ALARM DETECTED!"
-        message = (
-            f"Frequency: {event.frequency:.1f} Hz\n"
-            f"Signal Strength: {event.strength:.2f}\n"
-            f"Confidence: {event.confidence:.2%}\n"
-            f"Time: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event.timestamp))}"
-        )
-        if is_test:
-            title = "TEST: " + title
-
-        
+    def build_payload(self, event: DetectionEvent, is_test: bool = False) -> Tuple[Dict[str, str], str]:
+        """Build the ntfy (headers, body) pair."""
         headers = {
-            "Title": title,
+            "Title": event.title(is_test),
             "Priority": "5",
             "Tags": "fire,warning" if not is_test else "test"
         }
+        return headers, event.text
+
+    async def send_notification(
+        self, event: DetectionEvent, is_test: bool = False, payload: Any = None
+    ) -> Optional[bool]:
+        """Send notification via ntfy.sh."""
+        headers, message = payload or self.build_payload(event, is_test)
         
         try:
-            response = requests.post(
+            # requests is blocking; run it off the event loop so notifiers
+            # gathered by NotificationManager actually overlap
+            response = await asyncio.to_thread(
+                self._session.post,
                 self.url,
                 data=message,
                 headers=headers,
@@ -105,6 +146,9 @@ class NtfyNotifier(BaseNotifier):
             return True
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Failed to send ntfy notification: {e}")
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and 400 <= status < 500 and status not in (408, 429):
+                return None  # Client error; the same request will keep failing
             return False
 
 
@@ -114,32 +158,72 @@ class NotificationManager:
     def __init__(self, notifiers: List[BaseNotifier] = None):
         self.notifiers = notifiers or []
         self.logger = logging.getLogger("notification_manager")
-    
-    async def notify_all(self, event: DetectionEvent, is_test: bool = False) -> Dict[str, bool]:
-        """Send notification to all enabled notifiers."""
-        if not self.notifiers:
-            self.logger.warning("No notifiers configured")
+        self._queue = queue.SimpleQueue()  # (event, is_test) pairs
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    def _enabled_notifiers(self) -> List[BaseNotifier]:
+        """Notifiers currently enabled; read on each call so toggling one takes effect."""
+        return [n for n in self.notifiers if n.enabled]
+
+    @property
+    def has_enabled(self) -> bool:
+        """Whether any notifier would actually be sent to."""
+        return any(n.enabled for n in self.notifiers)
+
+    def dispatch(self, event: DetectionEvent, is_test: bool = False) -> None:
+        """Queue an event for the background notification worker.
+
+        Safe to call from the audio callback thread: after the first call this
+        is a single non-blocking queue put.
+        """
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run_worker, name="notifications", daemon=True)
+                    self._worker.start()
+        self._queue.put_nowait((event, is_test))
+
+    def _run_worker(self):
+        """Send queued events in order on one event loop for the life of the process.
+
+        The blocking get happens on this daemon thread rather than in an executor,
+        so an idle worker never holds up interpreter shutdown.
+        """
+        loop = asyncio.new_event_loop()
+        while True:
+            event, is_test = self._queue.get()
+            loop.run_until_complete(self.notify_all(event, is_test))
+
+    async def notify_all(
+        self, event: DetectionEvent, is_test: bool = False, mode: Literal["all", "any"] = "all"
+    ) -> Dict[str, bool]:
+        """Send notification to all enabled notifiers.
+
+        With mode="any", the first notifier to succeed cancels the rest (including
+        any still waiting to retry), so a slow channel can't delay returning.
+        """
+        enabled = self._enabled_notifiers()
+        if not enabled:
+            self.logger.warning("No enabled notifiers found" if self.notifiers else "No notifiers configured")
             return {}
         
         # Send notifications concurrently
-        tasks = []
-        notifier_names = []
+        tasks = [notifier.notify_with_retry(event, is_test) for notifier in enabled]
+        notifier_names = [notifier.name for notifier in enabled]
         
-        for notifier in self.notifiers:
-            if notifier.enabled:
-                tasks.append(notifier.notify_with_retry(event, is_test))
-                notifier_names.append(notifier.name)
-        
-        if not tasks:
-            self.logger.warning("No enabled notifiers found")
-            return {}
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        if mode == "any":
+            results = await self._first_success(tasks)
+        else:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Process results
         notification_results = {}
         for name, result in zip(notifier_names, results):
-            if isinstance(result, Exception):
+            if isinstance(result, asyncio.CancelledError):
+                self.logger.info(f"Notifier {name} cancelled after another notifier succeeded")
+                notification_results[name] = False
+            elif isinstance(result, Exception):
                 self.logger.error(f"Notifier {name} raised exception: {result}")
                 notification_results[name] = False
             else:
@@ -150,4 +234,27 @@ class NotificationManager:
         total = len(notification_results)
         self.logger.info(f"Notification summary: {successful}/{total} successful")
         
-        return notification_results
\ No newline at end of file
+        return notification_results
+
+    @staticmethod
+    async def _first_success(coros: List) -> List:
+        """Run coros concurrently until one returns True, cancelling the rest.
+
+        Returns per-coroutine results in order, like gather(return_exceptions=True),
+        with a CancelledError for each one that was cut short.
+        """
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if any(not t.cancelled() and t.exception() is None and t.result() for t in done):
+                break
+
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        return [
+            asyncio.CancelledError() if t.cancelled() else (t.exception() or t.result())
+            for t in tasks
+        ]
@@ -2,21 +2,34 @@
 """
 Cross-platform audio recording script for smoke detector tests.
 Records audio in the correct format: 44.1kHz, mono, 16-bit WAV.
+Captures in-process with sounddevice, or through ffmpeg with --ffmpeg.
 """
 
+import argparse
 import platform
+import queue
 import subprocess
 import sys
 import time
 import threading
+import wave
 from datetime import datetime
 from pathlib import Path
 
+try:
+    import sounddevice as sd
+except ImportError:  # Optional here; recording falls back to ffmpeg
+    sd = None
+
+SAMPLE_RATE = 44100  # Hz - 44.1 kHz, the rate the detector expects
+BLOCK_SIZE = 4096  # samples - Matches the detector's chunk size
+
 
 def build_ffmpeg_command(input_format, device_input, output_file, duration=None):
     """Build ffmpeg command with proper option ordering."""
-    # Base command with global options
-    cmd = ['ffmpeg', '-y']
+    # Base command with global options: only errors go to stderr (no banner or
+    # progress stats to fill an unread pipe), and stdin is left to the caller
+    cmd = ['ffmpeg', '-y', '-hide_banner', '-nostats', '-loglevel', 'error', '-nostdin']
     
     # Input options
     cmd.extend(['-thread_queue_size', '8192'])  # Large buffer for all platforms
@@ -204,8 +217,8 @@ def record_audio(device_name, input_format):
     print("Press ENTER to stop recording...")
     print("-" * 50)
 
-    # Start ffmpeg process
-    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # Start ffmpeg process (stdout is unused; stderr only carries errors)
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
 
     # Wait for user input in separate thread
     stop_event = threading.Event()
@@ -218,10 +231,11 @@ def record_audio(device_name, input_format):
     input_thread.daemon = True
     input_thread.start()
 
-    # Monitor recording
+    # Monitor recording, ticking the elapsed time every 0.1s; the wait returns as
+    # soon as Enter is pressed rather than at the end of the tick
     start_time = time.time()
     try:
-        while not stop_event.is_set():
+        while True:
             if process.poll() is not None:
                 # Process ended unexpectedly
                 stdout, stderr = process.communicate()
@@ -232,7 +246,8 @@ def record_audio(device_name, input_format):
             # Show elapsed time
             elapsed = time.time() - start_time
             print(f"\rRecording... {elapsed:.1f}s", end='', flush=True)
-            time.sleep(0.1)
+            if stop_event.wait(0.1):
+                break
 
     except KeyboardInterrupt:
         stop_event.set()
@@ -247,25 +262,23 @@ def record_audio(device_name, input_format):
     except subprocess.TimeoutExpired:
         process.kill()
 
-    # Check if file was created
+    return report_recording(output_file, time.time() - start_time)
+
+
+def report_recording(output_file, duration):
+    """Print a summary of a finished recording; returns whether the file exists."""
     if Path(output_file).exists():
         file_size = Path(output_file).stat().st_size
-        duration = time.time() - start_time
         print(f"✓ Recording saved: {output_file}")
         print(f"  Duration: {duration:.1f}s")
         print(f"  File size: {file_size:,} bytes")
 
-        # Verify file format
+        # Verify file format from the WAV header
         try:
-            result = subprocess.run(['ffprobe', '-v', 'quiet', '-print_format', 'json',
-                                     '-show_format', '-show_streams', output_file],
-                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            if result.returncode == 0:
-                import json
-                info = json.loads(result.stdout)
-                stream = info['streams'][0]
-                print(f"  Verified: {stream['sample_rate']}Hz, {stream['channels']} channel(s), {stream['codec_name']}")
-        except:
+            with wave.open(output_file, 'rb') as wav:
+                print(f"  Verified: {wav.getframerate()}Hz, {wav.getnchannels()} channel(s), "
+                      f"{8 * wav.getsampwidth()}-bit PCM")
+        except (wave.Error, EOFError, OSError):
             pass
 
         return True
@@ -274,16 +287,121 @@ def record_audio(device_name, input_format):
         return False
 
 
-def main():
-    """Main function."""
-    print("🎤 Audio Recording Tool for Smoke Detector Tests")
-    print("=" * 50)
-    print("This tool records audio in the correct format for your tests:")
-    print("• Sample Rate: 44.1 kHz")
-    print("• Channels: Mono (1)")
-    print("• Bit Depth: 16-bit")
-    print("• Format: WAV (PCM)")
+def select_sounddevice_device():
+    """Interactive input device selection from the sounddevice (PortAudio) device list."""
+    devices = sd.query_devices()
+    input_devices = [i for i, device in enumerate(devices) if device['max_input_channels'] > 0]
+    if not input_devices:
+        print("No audio devices found!")
+        sys.exit(1)
+
+    print("Available audio devices:")
+    print("-" * 40)
+    for i in input_devices:
+        default_marker = " (default)" if i == sd.default.device[0] else ""
+        print(f"  {i}: {devices[i]['name']}{default_marker}")
+
+    while True:
+        try:
+            print(f"\nEnter device number (ENTER = default) or 'q' to quit: ", end='')
+            choice = input().strip()
+
+            if choice.lower() == 'q':
+                sys.exit(0)
+
+            device_id = int(choice) if choice else sd.default.device[0]
+            if device_id not in input_devices:
+                print("Invalid device number!")
+                continue
+
+            # Opening a stream with these settings is the real test; check them up front
+            try:
+                sd.check_input_settings(device=device_id, channels=1, dtype='int16', samplerate=SAMPLE_RATE)
+            except Exception as e:
+                print(f"✗ Device test failed: {e}")
+                print("Try another device.")
+                continue
+
+            print("✓ Device test successful!")
+            return device_id, devices[device_id]['name']
+
+        except ValueError:
+            print("Please enter a valid number!")
+        except KeyboardInterrupt:
+            print("\nExiting...")
+            sys.exit(0)
+
+
+def record_audio_sounddevice(device_id):
+    """Record audio in-process with sounddevice until user stops."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = f"recording_{timestamp}.wav"
 
+    print(f"\nStarting recording to: {output_file}")
+    print("Format: 44.1kHz, mono, 16-bit WAV")
+    print("Press ENTER to stop recording...")
+    print("-" * 50)
+
+    # The audio callback only hands blocks over; the file is written on this thread
+    blocks = queue.SimpleQueue()
+    overflowed = threading.Event()
+
+    def callback(indata, frames, time_info, status):
+        if status.input_overflow:
+            overflowed.set()
+        blocks.put(indata.tobytes())
+
+    stop_event = threading.Event()
+
+    def wait_for_input():
+        input()  # Wait for Enter key
+        stop_event.set()
+
+    input_thread = threading.Thread(target=wait_for_input)
+    input_thread.daemon = True
+    input_thread.start()
+
+    with wave.open(output_file, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)  # bytes - 16-bit PCM
+        wav.setframerate(SAMPLE_RATE)
+
+        start_time = time.time()
+        try:
+            with sd.InputStream(device=device_id, channels=1, dtype='int16', samplerate=SAMPLE_RATE,
+                                blocksize=BLOCK_SIZE, callback=callback):
+                while not stop_event.is_set():
+                    try:
+                        wav.writeframes(blocks.get(timeout=0.1))
+                    except queue.Empty:
+                        pass
+
+                    # Show elapsed time
+                    elapsed = time.time() - start_time
+                    print(f"\rRecording... {elapsed:.1f}s", end='', flush=True)
+        except KeyboardInterrupt:
+            stop_event.set()
+        except sd.PortAudioError as e:
+            print(f"\nRecording ended unexpectedly!")
+            print(f"Error: {e}")
+            return False
+
+        # Stop recording: the stream is closed, so write out what is still queued
+        print(f"\nStopping recording...")
+        while True:
+            try:
+                wav.writeframes(blocks.get_nowait())
+            except queue.Empty:
+                break
+
+    if overflowed.is_set():
+        print("⚠️  Input overflow: some audio was dropped during the recording")
+
+    return report_recording(output_file, time.time() - start_time)
+
+
+def setup_ffmpeg_recording():
+    """Check for ffmpeg and select a device; returns (record function, device name, device display name)."""
     # Check if ffmpeg is available
     try:
         subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
@@ -302,6 +420,36 @@ def main():
 
     # Device selection
     device_name, device_display = select_audio_device()
+    return (lambda device: record_audio(device, input_format)), device_name, device_display
+
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Record test audio for the smoke detector")
+    parser.add_argument("--ffmpeg", action="store_true",
+                        help="Record through an ffmpeg subprocess instead of sounddevice")
+    args = parser.parse_args()
+
+    print("🎤 Audio Recording Tool for Smoke Detector Tests")
+    print("=" * 50)
+    print("This tool records audio in the correct format for your tests:")
+    print("• Sample Rate: 44.1 kHz")
+    print("• Channels: Mono (1)")
+    print("• Bit Depth: 16-bit")
+    print("• Format: WAV (PCM)")
+
+    use_ffmpeg = args.ffmpeg
+    if not use_ffmpeg and sd is None:
+        print("\nℹ️  sounddevice not installed, recording through ffmpeg")
+        use_ffmpeg = True
+
+    if use_ffmpeg:
+        record, device_name, device_display = setup_ffmpeg_recording()
+    else:
+        print(f"\nAudio input: sounddevice (PortAudio)")
+        device_name, device_display = select_sounddevice_device()
+        record = record_audio_sounddevice
     print(f"\nSelected device: {device_display}")
 
     # Start recording
@@ -311,7 +459,7 @@ def main():
             if input().strip().lower() == 'q':
                 break
 
-            success = record_audio(device_name, input_format)
+            success = record(device_name)
 
             if success:
                 print(f"\nRecord another? (ENTER = yes, 'q' = quit): ", end='')
@@ -1,18 +1,44 @@
 #!/usr/bin/env -S uv run --script
 """Simple test to debug detection issues"""
 
-from smoke_detection_algorithm import SmokeAlarmDetector
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-detector = SmokeAlarmDetector()
-test_file = Path("test_audio/first_alert_sa511.wav")
+from smoke_detection_algorithm import SmokeAlarmDetector
+from test_runner import detect_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the detector over audio files")
+    parser.add_argument("paths", nargs="*", type=Path, default=[Path("test_audio/first_alert_sa511.wav")],
+                        help="Audio files, or directories of .wav files")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Files processed in parallel")
+    args = parser.parse_args()
+
+    test_files = []
+    for path in args.paths:
+        test_files.extend(sorted(path.glob("*.wav")) if path.is_dir() else [path])
+
+    detector = SmokeAlarmDetector()
+    if len(test_files) == 1:
+        print("Testing detection on", test_files[0])
+        results = detector.process_audio_file(test_files[0], verbose=True)
+        print(f"Results: {results}")
+    else:
+        print(f"Testing detection on {len(test_files)} files...")
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            for test_file, results in zip(test_files, executor.map(detect_file, test_files)):
+                times = ", ".join(f"{d['timestamp']:.1f}s" for d in results) or "none"
+                print(f"   {test_file.name}: {len(results)} detection(s) ({times})")
+
+    # Check some basic properties
+    print(f"Sample rate: {detector.sample_rate}")
+    print(f"Target frequency: {detector.target_frequency}")
+    print(f"Frequency tolerance: {detector.frequency_tolerance}")
+    print(f"Minimum signal ratio: {detector.min_signal_ratio}")
 
-print("Testing detection on", test_file)
-results = detector.process_audio_file(test_file, verbose=True)
-print(f"Results: {results}")
 
-# Check some basic properties
-print(f"Sample rate: {detector.sample_rate}")
-print(f"Target frequency: {detector.target_frequency}")
-print(f"Frequency tolerance: {detector.frequency_tolerance}")
-print(f"Confidence threshold: {detector.confidence_threshold}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,12 @@ This module contains the complete smoke alarm detection logic used by both live
 """
 
 import numpy as np
+from scipy import fft as sfft
 from scipy import signal
 import time
-from collections import deque
-from typing import Optional, Dict, Callable, Any
+from typing import Optional, Dict, List, Callable, Any, Tuple
+
+from spectral_kernels import band_stats, magnitude_stats, window_counts
 
 
 class SmokeAlarmDetector:
@@ -52,24 +54,214 @@ class SmokeAlarmDetector:
         self.ambient_samples_count = 0
         self.is_learning_ambient = True
         
-        # Track detection windows for sustained signal analysis
-        self.detection_windows = deque(maxlen=100)  # samples - Store recent detection results (circular buffer)
+        # Track detection windows for sustained signal analysis: one column per field in a
+        # ring buffer of the last 100 windows. Each value is written twice (slot and slot +
+        # capacity) so the windows, oldest first, are always one contiguous slice.
+        self._history_size = 100  # samples - Store recent detection results (circular buffer)
+        self._history_count = 0
+        self._history_ts = np.zeros(2 * self._history_size)
+        self._history_strong = np.zeros(2 * self._history_size, dtype=bool)
+        self._history_freq = np.zeros(2 * self._history_size)
+        self._history_ratio = np.zeros(2 * self._history_size)
+        self._history_mag = np.zeros(2 * self._history_size)
         self.last_alarm_time: Optional[float] = None
         self.is_alarm_latched = False
         
+        # FFT bin layout per chunk length: (freqs, band_lo, band_hi) with the target band as a slice
+        self._bin_layouts: Dict[int, Tuple[np.ndarray, int, int]] = {}
+        _, band_lo, band_hi = self._bin_layout(chunk_size)
+        if band_hi <= band_lo:
+            raise ValueError(
+                f"Target band {target_frequency - frequency_tolerance:.0f}-{target_frequency + frequency_tolerance:.0f} Hz "
+                f"contains no FFT bins at {sample_rate} Hz with chunk_size {chunk_size}"
+            )
+        
+        # Hann window per chunk length, built once instead of on every chunk
+        self._windows: Dict[Tuple[int, bool], np.ndarray] = {}
+        self._window(chunk_size)
+        
+        # Reused float32 buffer the incoming chunk is windowed into
+        self._scratch = np.empty(chunk_size, dtype=np.float32)
+        
+    def _bin_layout(self, n_samples: int) -> Tuple[np.ndarray, int, int]:
+        """Get the rfft frequency grid and target band bin range for a chunk length (cached)."""
+        layout = self._bin_layouts.get(n_samples)
+        if layout is None:
+            freqs = np.fft.rfftfreq(n_samples, 1/self.sample_rate)
+            band_lo = int(np.searchsorted(freqs, self.target_frequency - self.frequency_tolerance, side='left'))
+            band_hi = int(np.searchsorted(freqs, self.target_frequency + self.frequency_tolerance, side='right'))
+            layout = self._bin_layouts[n_samples] = (freqs, band_lo, band_hi)
+        return layout
+    
+    def _window(self, n_samples: int, int16: bool = False) -> np.ndarray:
+        """Get the float32 Hann window for a chunk length (cached).
+        
+        With int16=True the window also carries the 1/32768 full-scale factor, so
+        raw int16 chunks window to exactly the values their float equivalents
+        would (the factor is a power of two, so folding it in is exact).
+        """
+        key = (n_samples, int16)
+        window = self._windows.get(key)
+        if window is None:
+            window = signal.windows.hann(n_samples).astype(np.float32)
+            if int16:
+                window *= np.float32(1 / 32768)
+            self._windows[key] = window
+        return window
+    
     def process_audio_chunk(self, audio_data: np.ndarray, timestamp: Optional[float] = None) -> Optional[Dict]:
         """
         Process an audio chunk and return detection info if a smoke alarm pattern is detected.
         
         Args:
-            audio_data: Audio data chunk
+            audio_data: Audio data chunk, float in [-1, 1] or raw int16 PCM
             timestamp: Absolute timestamp for the chunk (for file processing)
             
         Returns:
             Detection dict if smoke alarm detected, None otherwise
         """
         current_time = timestamp if timestamp is not None else time.time()
+        if self._is_latched(current_time):
+            return None  # Still in latch period
+        
+        # Apply window function to reduce spectral leakage, in float32 and in place
+        n_samples = len(audio_data)
+        windowed = self._scratch if n_samples == len(self._scratch) else np.empty(n_samples, dtype=np.float32)
+        np.multiply(audio_data, self._window(n_samples, audio_data.dtype == np.int16), out=windowed, casting='same_kind')
+        
+        # An empty target band takes the full path, which returns before the sustained analysis
+        _, band_lo, band_hi = self._bin_layout(n_samples)
+        if band_hi > band_lo and self._is_too_quiet(np.abs(windowed).sum(dtype=np.float64)):
+            return self._record_quiet_chunk(current_time)
+        
+        # Compute FFT, then magnitudes and band statistics in one pass
+        magnitudes, chunk_stats = magnitude_stats(sfft.rfft(windowed, overwrite_x=True), band_lo, band_hi)
+        return self._analyze_spectrum(magnitudes, n_samples, current_time, chunk_stats)
+    
+    def process_audio_file(self, audio_file, verbose: bool = False, block_frames: int = 512,
+                           fft_workers: int = -1) -> List[Dict]:
+        """
+        Run the detector over an audio file, chunk by chunk, as if it were streamed.
+        
+        The file is read block_frames chunks at a time and each block goes through
+        process_audio_batch, with timestamps measured from the start of the file.
+        A trailing partial chunk is ignored.
         
+        Args:
+            audio_file: Path to the audio file
+            verbose: Print progress and results
+            block_frames: Number of chunks read and transformed per batched FFT
+            fft_workers: Threads for the batched FFT (-1 = all CPUs; use 1 when files
+                are already processed in parallel)
+            
+        Returns:
+            List of detection dicts, in order
+        """
+        from audio_io import open_audio_blocks
+        
+        sr = self.sample_rate
+        total_samples, blocks = open_audio_blocks(audio_file, sr, block_frames * self.chunk_size)
+        
+        if verbose:
+            print(f"   Duration: {total_samples / sr:.1f}s")
+            print(f"   Processing {total_samples // self.chunk_size} chunks...")
+        
+        detections = []
+        start_sample = 0
+        for block in blocks:
+            detections.extend(self.process_audio_batch(block, start_sample, block_frames, fft_workers))
+            start_sample += len(block)
+        
+        if verbose:
+            if detections:
+                print(f"   ✅ Found {len(detections)} smoke alarm detections:")
+                for i, detection in enumerate(detections, 1):
+                    print(f"      {i}. {detection['timestamp']:.1f}s")
+            else:
+                print(f"   ℹ️  No smoke alarms detected")
+        
+        return detections
+    
+    def process_audio_batch(self, audio_data: np.ndarray, start_sample: int = 0, block_frames: int = 512,
+                            fft_workers: int = -1) -> List[Dict]:
+        """
+        Run the detector over in-memory audio, as consecutive chunk_size chunks.
+        
+        Chunks are windowed and transformed block_frames at a time with a single
+        batched rfft, and the per-chunk band statistics are reduced over the whole
+        block at once. Each chunk then goes through the same analysis (and the
+        same callback/hooks) as process_audio_stream, so the results match
+        streaming the same chunks. A trailing partial chunk is ignored.
+        
+        Args:
+            audio_data: Audio samples, float in [-1, 1] or raw int16 PCM
+            start_sample: Sample offset of audio_data; chunk timestamps are
+                (start_sample + offset within audio_data) / sample_rate
+            block_frames: Number of chunks transformed per batched FFT
+            fft_workers: Threads for the batched FFT (-1 = all CPUs)
+            
+        Returns:
+            List of detection dicts, in order
+        """
+        window = self._window(self.chunk_size, audio_data.dtype == np.int16)
+        _, band_lo, band_hi = self._bin_layout(self.chunk_size)
+        n_chunks = len(audio_data) // self.chunk_size
+        frames = audio_data[:n_chunks * self.chunk_size].reshape(n_chunks, self.chunk_size)
+        detections = []
+        
+        for block_start in range(0, n_chunks, block_frames):
+            windowed = np.multiply(frames[block_start:block_start + block_frames], window, dtype=np.float32)
+            peak_bounds = np.abs(windowed).sum(axis=1, dtype=np.float64)
+            spectra = sfft.rfft(windowed, axis=1, overwrite_x=True, workers=fft_workers)
+            magnitudes, stats = magnitude_stats(spectra, band_lo, band_hi)
+            
+            for row in range(len(windowed)):
+                current_time = (start_sample + (block_start + row) * self.chunk_size) / self.sample_rate
+                if self._is_latched(current_time):
+                    continue
+                if self._is_too_quiet(peak_bounds[row]):
+                    detection = self._record_quiet_chunk(current_time)
+                else:
+                    detection = self._analyze_spectrum(
+                        magnitudes[row], self.chunk_size, current_time, tuple(stat[row] for stat in stats)
+                    )
+                if detection:
+                    detections.append(detection)
+                    if self.detection_callback:
+                        self.detection_callback(detection)
+        
+        return detections
+    
+    def _is_too_quiet(self, peak_bound: float) -> bool:
+        """Whether a chunk is certain to fail the ambient-ratio test, from an upper
+        bound on its spectral peak.
+        
+        Every rfft bin satisfies |X_k| <= sum(|windowed|), so once the ambient
+        level is known, a chunk whose bound is under min_signal_ratio x ambient
+        cannot be a strong signal and its FFT can be skipped. The 0.1% margin
+        covers float32 FFT rounding. Disabled while learning and whenever a hook
+        that expects per-chunk spectral data is attached; callers only consult it
+        when the chunk's target band has bins (always true at chunk_size).
+        """
+        if (self.is_learning_ambient or self.on_chunk_analyzed or self.on_peak_found
+                or self.on_signal_strength_calculated or self.on_detection_recorded):
+            return False
+        return peak_bound * 1.001 <= self.min_signal_ratio * (self.ambient_background_level + 1e-10)
+    
+    def _record_quiet_chunk(self, current_time: float) -> Optional[Dict]:
+        """Record a chunk rejected by _is_too_quiet as a weak window and run the
+        sustained analysis.
+        
+        Frequency, ratio and magnitude are stored as 0.0 rather than computed, so
+        the history differs from a full analysis in those columns for this row. The
+        detection decision is the same: the sustained analysis only reads those
+        columns for strong windows, and ignores the values passed to it here.
+        """
+        self._record_detection_window(current_time, False, 0.0, 0.0, 0.0)
+        return self._analyze_sustained_detection(current_time, 0.0, 0.0)
+    
+    def _is_latched(self, current_time: float) -> bool:
+        """Start the clock on the first chunk and report whether the post-alarm latch is active."""
         # Initialize start time on first chunk
         if self.start_time is None:
             self.start_time = current_time
@@ -77,40 +269,43 @@ class SmokeAlarmDetector:
         # Check if we're in alarm latch period
         if self.is_alarm_latched and self.last_alarm_time:
             if current_time - self.last_alarm_time < self.alarm_latch_time:
-                return None  # Still in latch period
-            else:
-                self.is_alarm_latched = False  # Reset latch
-        
-        # Apply window function to reduce spectral leakage
-        windowed = audio_data * signal.windows.hann(len(audio_data))
+                return True
+            self.is_alarm_latched = False  # Reset latch
+        return False
+    
+    def _analyze_spectrum(self, magnitudes: np.ndarray, n_samples: int, current_time: float,
+                          chunk_stats: Optional[Tuple[Any, Any, Any]] = None) -> Optional[Dict]:
+        """Run the detection logic on the magnitude spectrum of one n_samples chunk.
         
-        # Compute FFT
-        fft = np.fft.rfft(windowed)
-        freqs = np.fft.rfftfreq(len(windowed), 1/self.sample_rate)
-        magnitudes = np.abs(fft)
+        chunk_stats may carry this chunk's precomputed band_stats (from a batched
+        reduction); otherwise they are computed here.
+        """
+        freqs, band_lo, band_hi = self._bin_layout(n_samples)
+        if chunk_stats is None:
+            chunk_stats = band_stats(magnitudes, band_lo, band_hi)
+        peak_idx, target_sum, total_sum = chunk_stats
+        target_sum, total_sum = float(target_sum), float(total_sum)  # Ratios below in float64 on every path
+        mean_magnitude = total_sum / len(magnitudes)  # Reuses the total sum rather than another pass
         
         # Instrumentation: Basic FFT analysis complete
         if self.on_chunk_analyzed:
             self.on_chunk_analyzed({
                 'timestamp': current_time,
-                'fft_size': len(fft),
+                'fft_size': len(magnitudes),
                 'magnitudes': magnitudes,
                 'freqs': freqs,
-                'mean_magnitude': np.mean(magnitudes)
+                'mean_magnitude': mean_magnitude
             })
         
         # Calculate overall background level (excluding target frequency)
-        target_range = (
-            self.target_frequency - self.frequency_tolerance,
-            self.target_frequency + self.frequency_tolerance
-        )
-        mask = (freqs >= target_range[0]) & (freqs <= target_range[1])
-        background_mask = ~mask
+        # from two contiguous sums rather than a boolean-mask gather
+        target_magnitudes = magnitudes[band_lo:band_hi]
+        background_bins = len(magnitudes) - len(target_magnitudes)
         
-        if np.any(background_mask):
-            current_background = np.mean(magnitudes[background_mask])
+        if background_bins > 0:
+            current_background = (total_sum - target_sum) / background_bins
         else:
-            current_background = np.mean(magnitudes) * 0.1  # ratio - Fallback: 10% of average magnitude as background estimate
+            current_background = mean_magnitude * 0.1  # ratio - Fallback: 10% of average magnitude as background estimate
         
         # Learn ambient levels during startup
         time_since_start = current_time - self.start_time
@@ -124,16 +319,14 @@ class SmokeAlarmDetector:
             self.is_learning_ambient = False  # Done learning
         
         # Analyze target frequency range
-        if not np.any(mask):
+        if len(target_magnitudes) == 0:
             self._record_detection_window(current_time, False, 0.0, 0.0, 0.0)
             return None
             
-        target_magnitudes = magnitudes[mask]
-        target_freqs = freqs[mask]
+        target_freqs = freqs[band_lo:band_hi]
         
-        # Find peak in target frequency range
-        peak_idx = np.argmax(target_magnitudes)
-        peak_magnitude = target_magnitudes[peak_idx]
+        # Peak in target frequency range
+        peak_magnitude = float(target_magnitudes[peak_idx])
         peak_frequency = target_freqs[peak_idx]
         
         # Instrumentation: Peak found in target range
@@ -153,6 +346,14 @@ class SmokeAlarmDetector:
         
         # Instrumentation: Signal strength calculations
         if self.on_signal_strength_calculated:
+            # 90th percentile via O(N) selection rather than a full percentile
+            # call, interpolating between the two neighbouring order statistics
+            # exactly as np.percentile does
+            pos = 0.9 * (len(magnitudes) - 1)
+            lo = int(pos)
+            hi = min(lo + 1, len(magnitudes) - 1)
+            ordered = np.partition(magnitudes, [lo, hi])
+            threshold_90 = ordered[lo] + (pos - lo) * (ordered[hi] - ordered[lo])
             self.on_signal_strength_calculated({
                 'timestamp': current_time,
                 'peak_magnitude': peak_magnitude,
@@ -161,15 +362,16 @@ class SmokeAlarmDetector:
                 'signal_to_current': signal_to_current,
                 'ambient_background_level': self.ambient_background_level,
                 'current_background': current_background,
-                'magnitude_threshold_90': np.percentile(magnitudes, 90),
-                'mean_magnitude': np.mean(magnitudes)
+                'magnitude_threshold_90': threshold_90,
+                'mean_magnitude': mean_magnitude
             })
         
         # Check if signal is strong enough with more stringent criteria
+        # (ordered so the usual rejection, weak vs. ambient, is tested first)
         is_strong_signal = (
             signal_to_background > self.min_signal_ratio and
             signal_to_current > 8.0 and  # ratio - Signal must be 8x stronger than current background noise
-            peak_magnitude > np.mean(magnitudes) * 12.0  # ratio - Peak must be 12x the average FFT magnitude
+            peak_magnitude > mean_magnitude * 12.0  # ratio - Peak must be 12x the average FFT magnitude
         )
         
         # Record this detection window
@@ -181,14 +383,17 @@ class SmokeAlarmDetector:
     
     def _record_detection_window(self, timestamp: float, is_strong_signal: bool, 
                                  frequency: float, signal_ratio: float, magnitude: float) -> None:
-        """Record a detection window result for sustained analysis."""
-        self.detection_windows.append({
-            'timestamp': timestamp,
-            'is_strong_signal': is_strong_signal,
-            'frequency': frequency,
-            'signal_ratio': signal_ratio,
-            'magnitude': magnitude
-        })
+        """Record a detection window for sustained analysis."""
+        slot = self._history_count % self._history_size
+        for column, value in (
+            (self._history_ts, timestamp),
+            (self._history_strong, is_strong_signal),
+            (self._history_freq, frequency),
+            (self._history_ratio, signal_ratio),
+            (self._history_mag, magnitude),
+        ):
+            column[slot] = column[slot + self._history_size] = value
+        self._history_count += 1
         
         # Instrumentation: Detection window recorded
         if self.on_detection_recorded:
@@ -198,9 +403,36 @@ class SmokeAlarmDetector:
                 'frequency': frequency,
                 'signal_ratio': signal_ratio,
                 'magnitude': magnitude,
-                'total_detection_windows': len(self.detection_windows)
+                'total_detection_windows': self._history_len()
             })
     
+    def _history_len(self) -> int:
+        return min(self._history_count, self._history_size)
+    
+    def _history_slice(self, last: Optional[int] = None) -> slice:
+        """Slice of the history columns holding the recorded windows (or the last `last`), oldest first."""
+        n = self._history_len()
+        stop = self._history_count % self._history_size + self._history_size if n == self._history_size else n
+        return slice(stop - min(n, last if last is not None else n), stop)
+    
+    @property
+    def detection_windows(self) -> List[Dict]:
+        """Recorded detection windows, oldest first."""
+        window = self._history_slice()
+        return [
+            {
+                'timestamp': float(ts),
+                'is_strong_signal': bool(strong),
+                'frequency': float(freq),
+                'signal_ratio': float(ratio),
+                'magnitude': float(mag)
+            }
+            for ts, strong, freq, ratio, mag in zip(
+                self._history_ts[window], self._history_strong[window], self._history_freq[window],
+                self._history_ratio[window], self._history_mag[window]
+            )
+        ]
+    
     def _analyze_sustained_detection(self, current_time: float, peak_frequency: float, 
                                      signal_ratio: float) -> Optional[Dict]:
         """
@@ -208,33 +440,41 @@ class SmokeAlarmDetector:
         
         This replaces the 3-beep pattern detection with frequency/loudness/time-domain analysis.
         """
-        if len(self.detection_windows) < 5:  # samples - Need minimum detection history for analysis
+        if self._history_len() < 5:  # samples - Need minimum detection history for analysis
             return None
         
-        # Analyze recent window (last N seconds)
+        # Analyze recent window (last N seconds) of the history columns
         analysis_window = self.alarm_sustain_threshold
-        recent_detections = [
-            d for d in self.detection_windows 
-            if current_time - d['timestamp'] <= analysis_window
-        ]
+        history = self._history_slice()
+        total_detections, strong_signal_count = window_counts(
+            self._history_ts[history], self._history_strong[history], current_time, analysis_window
+        )
         
-        if len(recent_detections) < 3:  # samples - Need minimum samples in analysis window for reliable detection
+        if total_detections < 3:  # samples - Need minimum samples in analysis window for reliable detection
             return None
         
         # Calculate metrics over the analysis window
-        strong_signal_count = sum(1 for d in recent_detections if d['is_strong_signal'])
-        total_detections = len(recent_detections)
         frequency_occupation_ratio = strong_signal_count / total_detections
         
         # Get frequency consistency
-        strong_detections = [d for d in recent_detections if d['is_strong_signal']]
-        if len(strong_detections) < 2:  # samples - Need at least 2 strong signals for frequency consistency analysis
+        if strong_signal_count < 2:  # samples - Need at least 2 strong signals for frequency consistency analysis
             return None
-            
-        frequencies = [d['frequency'] for d in strong_detections]
+        
+        # The count-only criteria below decide most windows; unless a hook wants the
+        # full metrics, skip the per-window statistics when they already fail
+        if not self.on_sustained_analysis and not (
+            strong_signal_count >= 5 and
+            0.20 <= frequency_occupation_ratio <= 0.80 and
+            frequency_occupation_ratio >= self.frequency_occupation_threshold
+        ):
+            return None
+        
+        strong = (current_time - self._history_ts[history] <= analysis_window) & self._history_strong[history]
+        frequencies = self._history_freq[history][strong]
         freq_std = np.std(frequencies)
         avg_frequency = np.mean(frequencies)
-        avg_signal_ratio = np.mean([d['signal_ratio'] for d in strong_detections])
+        signal_ratios = self._history_ratio[history][strong]
+        avg_signal_ratio = np.mean(signal_ratios)
         
         # Enhanced alarm detection criteria with better discrimination
         # 1. High frequency occupation (signal present most of the time)
@@ -244,7 +484,6 @@ class SmokeAlarmDetector:
         # 5. Consistent signal strength (not just noise spikes)
         # 6. Temporal pattern analysis (not constant presence)
         
-        signal_ratios = [d['signal_ratio'] for d in strong_detections]
         signal_ratio_std = np.std(signal_ratios) if len(signal_ratios) > 1 else 0.0
         
         # Check for temporal variation (smoke alarms often have pulses, not constant tones)
@@ -269,7 +508,7 @@ class SmokeAlarmDetector:
             has_reasonable_variation and  # Some strength variation expected  
             has_appropriate_consistency and  # Proper frequency and strength consistency
             self.target_frequency - self.frequency_tolerance <= avg_frequency <= self.target_frequency + self.frequency_tolerance and
-            len(strong_detections) >= 5  # samples - Need at least 5 strong detections for sustained alarm confirmation
+            strong_signal_count >= 5  # samples - Need at least 5 strong detections for sustained alarm confirmation
         )
         
         # Instrumentation: Sustained analysis complete
@@ -309,33 +548,34 @@ class SmokeAlarmDetector:
     
     def get_detection_info(self) -> dict:
         """Get information about the current detection state."""
-        if len(self.detection_windows) < 2:
+        if self._history_len() < 2:
             return {}
         
         # Get info about recent detection windows
-        recent_windows = list(self.detection_windows)[-10:]  # samples - Analyze last 10 detection windows for status
-        strong_signals = [d for d in recent_windows if d['is_strong_signal']]
+        recent = self._history_slice(10)  # samples - Analyze last 10 detection windows for status
+        recent_count = recent.stop - recent.start
+        strong = self._history_strong[recent]
         
-        if not strong_signals:
+        if not strong.any():
             return {
                 'ambient_background_level': self.ambient_background_level,
                 'is_learning_ambient': self.is_learning_ambient,
-                'detection_windows_count': len(recent_windows),
+                'detection_windows_count': recent_count,
                 'strong_signals_count': 0
             }
         
-        frequencies = [d['frequency'] for d in strong_signals]
-        signal_ratios = [d['signal_ratio'] for d in strong_signals]
+        frequencies = self._history_freq[recent][strong]
+        signal_ratios = self._history_ratio[recent][strong]
         
         return {
             'ambient_background_level': self.ambient_background_level,
             'is_learning_ambient': self.is_learning_ambient,
-            'detection_windows_count': len(recent_windows),
-            'strong_signals_count': len(strong_signals),
+            'detection_windows_count': recent_count,
+            'strong_signals_count': len(frequencies),
             'avg_frequency': np.mean(frequencies),
             'frequency_std': np.std(frequencies) if len(frequencies) > 1 else 0.0,
             'avg_signal_ratio': np.mean(signal_ratios),
-            'last_timestamp': recent_windows[-1]['timestamp'],
+            'last_timestamp': float(self._history_ts[recent.stop - 1]),
             'is_alarm_latched': self.is_alarm_latched,
             'last_alarm_time': self.last_alarm_time
         }
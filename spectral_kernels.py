@@ -0,0 +1,142 @@
+"""
+Per-chunk spectrum and detection-history reductions used by the smoke alarm detector.
+
+The reductions run as single-pass Numba kernels when numba is installed
+(`uv sync --extra fast`) and fall back to equivalent NumPy code otherwise.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Optional dependency; NumPy fallback below
+    njit = None
+
+
+def _band_stats_numpy(magnitudes: np.ndarray, band_lo: int, band_hi: int) -> Tuple:
+    target_magnitudes = magnitudes[..., band_lo:band_hi]
+    if target_magnitudes.shape[-1]:
+        peak_idx = target_magnitudes.argmax(axis=-1)
+    else:
+        peak_idx = np.full(magnitudes.shape[:-1], -1) if magnitudes.ndim > 1 else -1
+    return peak_idx, target_magnitudes.sum(axis=-1), magnitudes.sum(axis=-1)
+
+
+def _window_counts_numpy(timestamps: np.ndarray, strong: np.ndarray, current_time: float, window: float) -> Tuple:
+    recent = current_time - timestamps <= window
+    return int(np.count_nonzero(recent)), int(np.count_nonzero(recent & strong))
+
+
+if njit is not None:
+    @njit(cache=True, boundscheck=False)
+    def _band_stats_row(magnitudes, band_lo, band_hi):
+        total_sum = 0.0
+        for i in range(band_lo):
+            total_sum += magnitudes[i]
+
+        peak_idx = -1
+        peak = -1.0
+        target_sum = 0.0
+        for i in range(band_lo, band_hi):
+            value = magnitudes[i]
+            target_sum += value
+            if value > peak:
+                peak = value
+                peak_idx = i - band_lo
+
+        for i in range(band_hi, magnitudes.shape[0]):
+            total_sum += magnitudes[i]
+        return peak_idx, target_sum, total_sum + target_sum
+
+    @njit(cache=True, boundscheck=False)
+    def _band_stats_rows(magnitudes, band_lo, band_hi):
+        n_rows = magnitudes.shape[0]
+        peak_idx = np.empty(n_rows, dtype=np.int64)
+        target_sum = np.empty(n_rows, dtype=np.float64)
+        total_sum = np.empty(n_rows, dtype=np.float64)
+        for row in range(n_rows):
+            peak_idx[row], target_sum[row], total_sum[row] = _band_stats_row(magnitudes[row], band_lo, band_hi)
+        return peak_idx, target_sum, total_sum
+
+    @njit(cache=True, boundscheck=False)
+    def _window_counts(timestamps, strong, current_time, window):
+        total = 0
+        strong_count = 0
+        for i in range(timestamps.shape[0]):
+            if current_time - timestamps[i] <= window:
+                total += 1
+                strong_count += strong[i]
+        return total, strong_count
+
+    @njit(cache=True, boundscheck=False)
+    def _magnitudes(spectrum, magnitudes, start, stop):
+        for i in range(start, stop):
+            re = spectrum[i].real
+            im = spectrum[i].imag
+            magnitudes[i] = np.sqrt(re * re + im * im)
+
+    @njit(cache=True, boundscheck=False)
+    def _magnitude_stats_row(spectrum, magnitudes, band_lo, band_hi):
+        n_bins = spectrum.shape[0]
+        band_lo = min(band_lo, n_bins)
+        band_hi = min(band_hi, n_bins)
+        _magnitudes(spectrum, magnitudes, 0, n_bins)
+        return _band_stats_row(magnitudes, band_lo, band_hi)
+
+    @njit(cache=True, boundscheck=False)
+    def _magnitude_stats_rows(spectrum, magnitudes, band_lo, band_hi):
+        n_rows = spectrum.shape[0]
+        peak_idx = np.empty(n_rows, dtype=np.int64)
+        target_sum = np.empty(n_rows, dtype=np.float64)
+        total_sum = np.empty(n_rows, dtype=np.float64)
+        for row in range(n_rows):
+            peak_idx[row], target_sum[row], total_sum[row] = _magnitude_stats_row(
+                spectrum[row], magnitudes[row], band_lo, band_hi
+            )
+        return peak_idx, target_sum, total_sum
+
+
+def magnitude_stats(spectrum: np.ndarray, band_lo: int, band_hi: int) -> Tuple:
+    """Take |spectrum| (1-D, or 2-D with one spectrum per row) as float32 and
+    its band_stats in the same pass.
+
+    Returns:
+        Tuple of (magnitudes, (peak index, in-band sum, total sum))
+    """
+    if njit is None:
+        magnitudes = np.abs(spectrum)
+        return magnitudes, _band_stats_numpy(magnitudes, band_lo, band_hi)
+    magnitudes = np.empty(spectrum.shape, dtype=np.float32)
+    if spectrum.ndim == 1:
+        return magnitudes, _magnitude_stats_row(spectrum, magnitudes, band_lo, band_hi)
+    return magnitudes, _magnitude_stats_rows(spectrum, magnitudes, band_lo, band_hi)
+
+
+def band_stats(magnitudes: np.ndarray, band_lo: int, band_hi: int) -> Tuple:
+    """Reduce magnitude spectra (1-D, or 2-D with one spectrum per row) along the
+    last axis to (in-band peak index, in-band sum, total sum).
+
+    The band is magnitudes[..., band_lo:band_hi]; the peak index is relative to
+    band_lo and is -1 when the band is empty.
+    """
+    if njit is None:
+        return _band_stats_numpy(magnitudes, band_lo, band_hi)
+    n_bins = magnitudes.shape[-1]
+    band_lo, band_hi = min(band_lo, n_bins), min(band_hi, n_bins)
+    if magnitudes.ndim == 1:
+        return _band_stats_row(magnitudes, band_lo, band_hi)
+    return _band_stats_rows(magnitudes, band_lo, band_hi)
+
+
+def window_counts(timestamps: np.ndarray, strong: np.ndarray, current_time: float, window: float) -> Tuple[int, int]:
+    """Count the detection windows recorded at most `window` seconds before
+    current_time, and how many of them were strong signals.
+
+    Returns:
+        Tuple of (windows in range, strong windows in range)
+    """
+    if njit is None:
+        return _window_counts_numpy(timestamps, strong, current_time, window)
+    return _window_counts(timestamps, strong, float(current_time), float(window))
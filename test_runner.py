@@ -4,30 +4,58 @@ Test runner for smoke detector validation.
 Processes all test cases and reports accuracy metrics.
 """
 
+import importlib
 import json
+import os
 import sys
-import librosa
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
+from audio_io import prefetch
 from smoke_detection_algorithm import SmokeAlarmDetector
 
+# Realistic matching tolerances: a detection may come up to 2 seconds early
+# or up to 30 seconds late
+EARLY_TOLERANCE = 2.0   # seconds before expected
+LATE_TOLERANCE = 30.0   # seconds after expected
+
+
+def detect_file(audio_file: Path) -> List[Dict]:
+    """Run a fresh detector over one audio file (one file per worker process)."""
+    # Files are already spread across processes, so each FFT stays single-threaded
+    return SmokeAlarmDetector().process_audio_file(audio_file, fft_workers=1)
+
+
+def _reload_detector() -> None:
+    """Re-import the detector module so edits made since the last run take effect."""
+    global SmokeAlarmDetector
+    SmokeAlarmDetector = importlib.reload(sys.modules[SmokeAlarmDetector.__module__]).SmokeAlarmDetector
+
 
 class TestRunner:
-    def __init__(self, test_dir: str = "test_audio"):
+    def __init__(self, test_dir: str = "test_audio", jobs: Optional[int] = None):
         self.test_dir = Path(test_dir)
         self.config_file = self.test_dir / "test_cases.json"
+        self.jobs = jobs or os.cpu_count()
+        # Parsed test cases and the (mtime, size) of the config they came from
+        self._test_cases: List[Dict] = []
+        self._test_cases_key: Optional[Tuple[int, int]] = None
     
     def load_test_cases(self) -> List[Dict]:
-        """Load test case configuration."""
+        """Load test case configuration (re-parsed only when the file changes)."""
         if not self.config_file.exists():
             print("❌ No test cases found. Add test cases to test_audio/test_cases.json")
             return []
         
-        with open(self.config_file) as f:
-            config = json.load(f)
+        stat = self.config_file.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key != self._test_cases_key:
+            with open(self.config_file) as f:
+                config = json.load(f)
+            self._test_cases, self._test_cases_key = config["test_cases"], key
         
-        return config["test_cases"]
+        return self._test_cases
     
     def run_single_test(self, test_name_or_index: str) -> Dict:
         """Run a single test case with detailed analysis."""
@@ -68,7 +96,11 @@ class TestRunner:
         
         # Run detection
         print(f"🎵 Processing audio file: {target_case['filename']}")
-        detections = self._process_audio_file(audio_file, verbose=True)
+        try:
+            detections = SmokeAlarmDetector().process_audio_file(audio_file, verbose=True)
+        except Exception as e:
+            print(f"   ❌ Error loading audio file: {e}")
+            return {}
         expected_alarms = self._parse_expected_alarms(target_case.get("expected_alarms", []))
         
         # Detailed analysis
@@ -91,78 +123,73 @@ class TestRunner:
         print("=" * 60)
         
         results = []
-        
-        for i, test_case in enumerate(test_cases, 1):
-            print(f"\n[{i}/{len(test_cases)}] {test_case['description']}")
+        audio_files = [self.test_dir / test_case["filename"] for test_case in test_cases]
+        
+        # Test files are independent, so detection runs in parallel across
+        # processes while results are reported in order as they complete
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            pending = []
+            for audio_file in audio_files:
+                if audio_file.exists():
+                    prefetch(audio_file)  # Start reading every file from disk up front
+                    pending.append(executor.submit(detect_file, audio_file))
+                else:
+                    pending.append(None)
             
-            audio_file = self.test_dir / test_case["filename"]
-            if not audio_file.exists():
-                print(f"   ❌ Audio file not found: {audio_file}")
-                continue
-            
-            # Run detection
-            detections = self._process_audio_file(audio_file, verbose=False)
-            expected_alarms = self._parse_expected_alarms(test_case.get("expected_alarms", []))
-            
-            # Analyze results
-            analysis = self._analyze_results(detections, expected_alarms, test_case)
-            results.append(analysis)
-            
-            # Print summary
-            self._print_test_summary(analysis)
+            for i, (test_case, audio_file, future) in enumerate(zip(test_cases, audio_files, pending), 1):
+                print(f"\n[{i}/{len(test_cases)}] {test_case['description']}")
+                
+                if future is None:
+                    print(f"   ❌ Audio file not found: {audio_file}")
+                    continue
+                
+                # Wait for this test's detections (a fresh detector per file)
+                try:
+                    detections = future.result()
+                except Exception as e:
+                    print(f"   ❌ Error loading audio file: {e}")
+                    continue
+                expected_alarms = self._parse_expected_alarms(test_case.get("expected_alarms", []))
+                
+                # Analyze results
+                analysis = self._analyze_results(detections, expected_alarms, test_case)
+                results.append(analysis)
+                
+                # Print summary
+                self._print_test_summary(analysis)
         
         # Print overall summary
         self._print_overall_summary(results)
         
         return {"total": len(results), "results": results}
     
-    def _process_audio_file(self, audio_file: Path, verbose: bool = True) -> List[Dict]:
-        """Process an audio file by streaming chunks to detector."""
-        if verbose:
-            print(f"   Loading audio file...")
-        
-        # Create fresh detector instance for this test
-        detector = SmokeAlarmDetector()
-        
-        # Load audio file
-        try:
-            audio_data, sr = librosa.load(audio_file, sr=detector.sample_rate, mono=True)
-        except Exception as e:
-            print(f"   ❌ Error loading audio file: {e}")
-            return []
-        
-        detections = []
-        
-        # Set up detection callback to collect results
-        def collect_detection(detection: Dict) -> None:
-            detections.append(detection)
-        
-        detector.set_detection_callback(collect_detection)
-        
-        # Process audio in chunks
-        chunk_samples = detector.chunk_size
-        total_chunks = len(audio_data) // chunk_samples
-        
-        if verbose:
-            print(f"   Duration: {len(audio_data) / sr:.1f}s")
-            print(f"   Processing {total_chunks} chunks...")
-        
-        for i in range(0, len(audio_data) - chunk_samples, chunk_samples):
-            chunk = audio_data[i:i + chunk_samples]
-            chunk_start_time = i / sr
+    def run_repl(self) -> None:
+        """Run tests named on stdin, one per line, until EOF.
+        
+        The process stays up between runs, so interpreter start-up, imports and
+        compiled kernels are paid once; the detector module is reloaded before
+        each run so algorithm edits are picked up without restarting.
+        """
+        print("🔁 Enter a test name or number, or 'all' (Ctrl-D to quit)")
+        while True:
+            try:
+                line = input("test> ").strip()
+            except (EOFError, KeyboardInterrupt):
+                print()
+                break
+            if not line:
+                continue
+            
+            try:
+                _reload_detector()
+            except Exception as e:
+                print(f"❌ Error reloading detector: {e}")
+                continue
             
-            # Stream chunk to detector - same method as live monitoring
-            detector.process_audio_stream(chunk, chunk_start_time)
-        
-        if verbose:
-            if detections:
-                print(f"   ✅ Found {len(detections)} smoke alarm detections:")
-                for i, detection in enumerate(detections, 1):
-                    print(f"      {i}. {detection['timestamp']:.1f}s")
+            if line == "all":
+                self.run_all_tests()
             else:
-                print(f"   ℹ️  No smoke alarms detected")
-        
-        return detections
+                self.run_single_test(line)
     
     def _parse_expected_alarms(self, expected_alarms: List[Union[str, float]]) -> List[float]:
         """Parse expected alarms from either mm:ss format or seconds."""
@@ -184,15 +211,39 @@ class TestRunner:
                 parsed_alarms.append(float(alarm))
         return parsed_alarms
     
+    def _match_alarms(self, expected: List[float], detected_times: List[float]) -> List[Tuple[int, int]]:
+        """Pair each expected alarm, in time order, with the first unmatched
+        detection from EARLY_TOLERANCE before it to LATE_TOLERANCE after it.
+        
+        detected_times must be in time order, as the detector reports them.
+        
+        Returns:
+            List of (expected index, detected index) pairs, in time order
+        """
+        matches = []
+        
+        # With both in time order (expected alarms are sorted here), one
+        # merge-style sweep does it: a detection too early for this alarm is too
+        # early for every later one, and an alarm with nothing in range leaves
+        # the detection for the next
+        j = 0
+        for i in sorted(range(len(expected)), key=lambda i: expected[i]):
+            while j < len(detected_times) and detected_times[j] - expected[i] < -EARLY_TOLERANCE:
+                j += 1
+            if j == len(detected_times):
+                break
+            if detected_times[j] - expected[i] <= LATE_TOLERANCE:
+                matches.append((i, j))
+                j += 1
+        
+        return matches
+    
     def _print_detailed_analysis(self, result: Dict, detections: List[Dict], expected: List[float]):
         """Print detailed breakdown of detection results."""
         print(f"\n📊 DETAILED ANALYSIS")
         print("=" * 50)
         
-        # Use realistic tolerances for detailed analysis display
-        early_tolerance = 2.0   # seconds before expected
-        late_tolerance = 30.0   # seconds after expected
-        detected_times = [d["timestamp"] for d in detections]
+        detected_times = result["detected_times"]
         
         print(f"Expected Alarms ({len(expected)}):")
         if expected:
@@ -208,38 +259,32 @@ class TestRunner:
         else:
             print("   (none)")
         
-        print(f"\nClassification (-{early_tolerance}s to +{late_tolerance}s tolerance):")
+        print(f"\nClassification (-{EARLY_TOLERANCE}s to +{LATE_TOLERANCE}s tolerance):")
         print("-" * 30)
         
-        # Track matches
-        matched_expected = set()
-        matched_detected = set()
+        # Reuse the pairing made by _analyze_results rather than matching again,
+        # as masks over arrays of the expected and detected times
+        matches = result["matches"]
+        expected_times = np.asarray(expected, dtype=np.float64)
+        detected = np.asarray(detected_times, dtype=np.float64)
+        matched_expected = np.zeros(len(expected_times), dtype=bool)
+        matched_detected = np.zeros(len(detected), dtype=bool)
+        matched_expected[[i for i, _ in matches]] = True
+        matched_detected[[j for _, j in matches]] = True
         
         # True Positives - detections that match expected alarms
         print("✅ TRUE POSITIVES:")
-        tp_count = 0
-        for i, expected_time in enumerate(expected):
-            for j, detected_time in enumerate(detected_times):
-                if j in matched_detected:
-                    continue
-                    
-                # Check if detection is within acceptable range
-                time_diff = detected_time - expected_time
-                if -early_tolerance <= time_diff <= late_tolerance:
-                    latency = detected_time - expected_time
-                    print(f"   Expected {expected_time:.1f}s → Detected {detected_time:.1f}s (latency: {latency:+.1f}s)")
-                    matched_expected.add(i)
-                    matched_detected.add(j)
-                    tp_count += 1
-                    break
+        for i, j in matches:
+            latency = detected_times[j] - expected[i]
+            print(f"   Expected {expected[i]:.1f}s → Detected {detected_times[j]:.1f}s (latency: {latency:+.1f}s)")
         
-        if tp_count == 0:
+        if not matches:
             print("   (none)")
         
         # False Negatives - expected alarms that weren't detected
         print(f"\n❌ FALSE NEGATIVES:")
-        fn_alarms = [expected[i] for i in range(len(expected)) if i not in matched_expected]
-        if fn_alarms:
+        fn_alarms = expected_times[~matched_expected]
+        if len(fn_alarms):
             for alarm_time in fn_alarms:
                 print(f"   Expected {alarm_time:.1f}s → NOT DETECTED")
         else:
@@ -247,8 +292,8 @@ class TestRunner:
         
         # False Positives - detections that don't match any expected alarm
         print(f"\n⚠️  FALSE POSITIVES:")
-        fp_detections = [detected_times[j] for j in range(len(detected_times)) if j not in matched_detected]
-        if fp_detections:
+        fp_detections = detected[~matched_detected]
+        if len(fp_detections):
             for det_time in fp_detections:
                 print(f"   Detected {det_time:.1f}s → NO EXPECTED ALARM")
         else:
@@ -268,25 +313,8 @@ class TestRunner:
         detected_times = [d["timestamp"] for d in detections]
         
         # Match detections to expected alarms (within realistic tolerances)
-        # Allow detection 2 seconds early or up to 30 seconds late
-        early_tolerance = 2.0   # seconds before expected
-        late_tolerance = 30.0   # seconds after expected
-        true_positives = 0
-        matched_expected = set()
-        matched_detected = set()
-        
-        for i, expected_time in enumerate(expected):
-            for j, detected_time in enumerate(detected_times):
-                if j in matched_detected:
-                    continue
-                    
-                # Check if detection is within acceptable range
-                time_diff = detected_time - expected_time
-                if -early_tolerance <= time_diff <= late_tolerance:
-                    true_positives += 1
-                    matched_expected.add(i)
-                    matched_detected.add(j)
-                    break
+        matches = self._match_alarms(expected, detected_times)
+        true_positives = len(matches)
         
         false_positives = len(detections) - true_positives
         false_negatives = len(expected) - true_positives
@@ -302,13 +330,9 @@ class TestRunner:
             recall = true_positives / (true_positives + false_negatives) if (true_positives + false_negatives) > 0 else 0.0
             f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0.0
         
-        # Calculate detection latency for matched alarms
-        latencies = []
-        for i, expected_time in enumerate(expected):
-            if i in matched_expected:
-                best_match = min(detected_times, key=lambda x: abs(x - expected_time))
-                latency = best_match - expected_time
-                latencies.append(latency)
+        # Detection latency of each matched alarm, taken from the detection it
+        # was paired with
+        latencies = [detected_times[j] - expected[i] for i, j in matches]
         
         avg_latency = sum(latencies) / len(latencies) if latencies else None
         
@@ -327,6 +351,7 @@ class TestRunner:
             "avg_latency": avg_latency,
             "expected_times": expected,
             "detected_times": detected_times,
+            "matches": matches,  # (expected index, detected index) pairs
             "success": f1 > 0.8  # Consider success if F1 > 0.8
         }
     
@@ -359,19 +384,23 @@ class TestRunner:
         print("📊 OVERALL TEST RESULTS")
         print("=" * 60)
         
-        passed = sum(1 for r in results if r["success"])
+        # Gather each metric into an array once, then reduce the arrays
+        keys = ("success", "precision", "recall", "f1_score", "true_positives", "false_positives", "false_negatives")
+        columns = {key: np.array([r[key] for r in results]) for key in keys}
+        latencies = np.array([r["avg_latency"] for r in results if r["avg_latency"] is not None])
+        
+        passed = int(columns["success"].sum())
         total = len(results)
         
-        avg_precision = sum(r["precision"] for r in results) / total
-        avg_recall = sum(r["recall"] for r in results) / total
-        avg_f1 = sum(r["f1_score"] for r in results) / total
+        avg_precision = columns["precision"].mean()
+        avg_recall = columns["recall"].mean()
+        avg_f1 = columns["f1_score"].mean()
         
-        total_tp = sum(r["true_positives"] for r in results)
-        total_fp = sum(r["false_positives"] for r in results)
-        total_fn = sum(r["false_negatives"] for r in results)
+        total_tp = int(columns["true_positives"].sum())
+        total_fp = int(columns["false_positives"].sum())
+        total_fn = int(columns["false_negatives"].sum())
         
-        latencies = [r["avg_latency"] for r in results if r["avg_latency"] is not None]
-        avg_latency = sum(latencies) / len(latencies) if latencies else None
+        avg_latency = latencies.mean() if len(latencies) else None
         
         print(f"Test Cases: {passed}/{total} passed ({passed/total*100:.1f}%)")
         print(f"Average Precision: {avg_precision:.3f}")
@@ -391,12 +420,16 @@ def main():
     parser = argparse.ArgumentParser(description="Run smoke detector tests")
     parser.add_argument("--test-dir", type=Path, default="test_audio", help="Test directory")
     parser.add_argument("--single", type=str, help="Run single test case by name/description or index number")
+    parser.add_argument("--repl", action="store_true", help="Keep running and read test names/numbers from stdin")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Test files processed in parallel")
     
     args = parser.parse_args()
     
-    runner = TestRunner(str(args.test_dir))
+    runner = TestRunner(str(args.test_dir), jobs=args.jobs)
     
-    if args.single:
+    if args.repl:
+        runner.run_repl()
+    elif args.single:
         runner.run_single_test(args.single)
     else:
         runner.run_all_tests()
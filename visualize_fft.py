@@ -5,14 +5,29 @@ Shows frequency domain analysis over time to help debug detection issues.
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
-import librosa
-import librosa.display
 import sys
 from pathlib import Path
+from audio_io import load_audio
+
+def waveform_envelope(y: np.ndarray, sr: int, n_columns: int):
+    """Reduce a waveform to its min/max envelope over n_columns equal time spans.
+    
+    Returns:
+        Tuple of (column center times, column minimums, column maximums)
+    """
+    step = len(y) // n_columns
+    columns = y[:step * n_columns].reshape(n_columns, step)
+    times = (np.arange(n_columns) + 0.5) * step / sr
+    return times, columns.min(axis=1), columns.max(axis=1)
 
 def visualize_audio_fft(audio_file: str):
     """Create FFT visualization for audio file."""
+    # Imported here so usage errors don't pay for the matplotlib/librosa import
+    import matplotlib.pyplot as plt
+    import librosa
+    import librosa.display
+    from scipy import fft as sfft
+    
     audio_path = Path(audio_file)
     
     if not audio_path.exists():
@@ -22,7 +37,7 @@ def visualize_audio_fft(audio_file: str):
     print(f"Loading audio file: {audio_path}")
     
     # Load audio
-    y, sr = librosa.load(audio_path, sr=48000)
+    y, sr = load_audio(audio_path, 48000)
     duration = len(y) / sr
     
     print(f"Duration: {duration:.1f}s")
@@ -32,9 +47,16 @@ def visualize_audio_fft(audio_file: str):
     fig, axes = plt.subplots(4, 1, figsize=(15, 12))
     fig.suptitle(f'Audio Analysis: {audio_path.name}', fontsize=16)
     
-    # 1. Time domain waveform
-    time = np.linspace(0, duration, len(y))
-    axes[0].plot(time, y)
+    # 1. Time domain waveform, as a min/max envelope with one column per
+    # output pixel once there are more samples than pixels
+    dpi = 150
+    n_columns = int(fig.get_figwidth() * dpi)
+    if len(y) >= 2 * n_columns:
+        time, y_min, y_max = waveform_envelope(y, sr, n_columns)
+        axes[0].fill_between(time, y_min, y_max, linewidth=0.5)
+    else:
+        time = np.linspace(0, duration, len(y))
+        axes[0].plot(time, y)
     axes[0].set_title('Waveform')
     axes[0].set_xlabel('Time (s)')
     axes[0].set_ylabel('Amplitude')
@@ -59,9 +81,14 @@ def visualize_audio_fft(audio_file: str):
         axes[1].axvline(x=45.0, color='red', linestyle='--', alpha=0.7)
         axes[1].axvline(x=70.3, color='orange', linestyle='--', alpha=0.7)
     
-    # 3. Smoke detector frequency range (2-4 kHz focus)
+    # 3. Smoke detector frequency range (2-4 kHz focus), drawn from just the
+    # rows of D in that band (plus one bin either side to cover the edges)
+    freqs = librosa.fft_frequencies(sr=sr)
+    band = slice(max(np.searchsorted(freqs, 2000) - 1, 0), np.searchsorted(freqs, 4000) + 1)
+    vmin, vmax = img.get_clim()  # Keep the full spectrogram's color scale
     axes[2].set_title('Smoke Detector Range Spectrogram (2-4 kHz)')
-    img2 = librosa.display.specshow(D, y_axis='hz', x_axis='time', sr=sr, hop_length=hop_length, ax=axes[2])
+    img2 = librosa.display.specshow(D[band], y_coords=freqs[band], y_axis='hz', x_axis='time', sr=sr,
+                                    hop_length=hop_length, ax=axes[2], vmin=vmin, vmax=vmax)
     axes[2].set_ylim(2000, 4000)  # Typical smoke detector range
     plt.colorbar(img2, ax=axes[2], format='%+2.0f dB')
     
@@ -84,27 +111,27 @@ def visualize_audio_fft(audio_file: str):
         # Extract windowed signals
         if expected_sample + window_size < len(y):
             expected_chunk = y[expected_sample:expected_sample + window_size]
-            expected_fft = np.abs(np.fft.fft(expected_chunk))
-            expected_freqs = np.fft.fftfreq(len(expected_fft), 1/sr)
+            expected_fft = np.abs(sfft.rfft(expected_chunk))
+            expected_freqs = sfft.rfftfreq(len(expected_chunk), 1/sr)
         else:
             expected_fft = None
             
         if detected_sample + window_size < len(y):
             detected_chunk = y[detected_sample:detected_sample + window_size]
-            detected_fft = np.abs(np.fft.fft(detected_chunk))
-            detected_freqs = np.fft.fftfreq(len(detected_fft), 1/sr)
+            detected_fft = np.abs(sfft.rfft(detected_chunk))
+            detected_freqs = sfft.rfftfreq(len(detected_chunk), 1/sr)
         else:
             detected_fft = None
         
         # Plot frequency spectrum comparison
         if expected_fft is not None:
-            # Only plot positive frequencies up to 8kHz
-            pos_mask = (expected_freqs >= 0) & (expected_freqs <= 8000)
+            # Only plot frequencies up to 8kHz (rfft gives just the positive ones)
+            pos_mask = expected_freqs <= 8000
             axes[3].plot(expected_freqs[pos_mask], expected_fft[pos_mask], 
                         label=f'Expected alarm time ({expected_time}s)', color='red', alpha=0.7)
         
         if detected_fft is not None:
-            pos_mask = (detected_freqs >= 0) & (detected_freqs <= 8000)
+            pos_mask = detected_freqs <= 8000
             axes[3].plot(detected_freqs[pos_mask], detected_fft[pos_mask], 
                         label=f'Detected alarm time ({detected_time}s)', color='orange', alpha=0.7)
         
@@ -119,9 +146,10 @@ def visualize_audio_fft(audio_file: str):
         axes[3].axvspan(2800, 3200, alpha=0.1, color='green', label='Typical smoke alarm range')
     else:
         # For other files, just show overall frequency content
-        fft = np.abs(np.fft.fft(y))
-        freqs = np.fft.fftfreq(len(fft), 1/sr)
-        pos_mask = (freqs >= 0) & (freqs <= 8000)
+        # One FFT over the whole signal, so use every core
+        fft = np.abs(sfft.rfft(y, workers=-1))
+        freqs = sfft.rfftfreq(len(y), 1/sr)
+        pos_mask = freqs <= 8000
         
         axes[3].plot(freqs[pos_mask], fft[pos_mask])
         axes[3].set_title('Overall Frequency Spectrum')
@@ -134,7 +162,7 @@ def visualize_audio_fft(audio_file: str):
     
     # Save visualization
     output_path = audio_path.with_suffix('.png')
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
+    plt.savefig(output_path, dpi=dpi, bbox_inches='tight')
     print(f"Visualization saved to: {output_path}")
     
     plt.show()